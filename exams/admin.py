@@ -6,6 +6,7 @@ from .models import AssistedCourse
 from .models import Chair
 from .models import Classroom
 from .models import Course
+from .models import CourseConflict
 from .models import Department
 from .models import Enrollment
 from .models import Exam
@@ -15,6 +16,8 @@ from .models import NoExam
 from .models import Offering
 from .models import Period
 from .models import Sitting
+from .models import SolverProgress
+from .models import SolverRun
 from .models import Student
 from .models import TimeCode
 from .models import Timetable
@@ -60,12 +63,63 @@ class CourseAdmin(admin.ModelAdmin):
     ordering = ("code",)
 
 
+class CourseConflictAdmin(admin.ModelAdmin):
+    list_display = ("course_a", "course_b", "period", "shared_students")
+    list_filter = ("period",)
+    list_select_related = ("course_a", "course_b", "period__academic_year")
+    ordering = ("-shared_students",)
+    search_fields = ("course_a__code", "course_b__code")
+
+
+class SolverProgressInline(admin.TabularInline):
+    model = SolverProgress
+    fields = ("elapsed", "incumbent", "bound", "gap", "nodes")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+class SolverRunAdmin(admin.ModelAdmin):
+    list_display = (
+        "command",
+        "problem",
+        "solver",
+        "started",
+        "duration",
+        "status",
+        "stop_reason",
+        "objective",
+        "last_gap",
+    )
+    list_filter = (
+        "command",
+        "solver",
+        "status",
+        "stop_reason",
+        "academic_year",
+    )
+    readonly_fields = ("started",)
+    inlines = (SolverProgressInline,)
+
+    def duration(self, obj):
+        if obj.finished is None:
+            return None
+        return obj.finished - obj.started
+
+    def last_gap(self, obj):
+        progress = obj.progress.exclude(gap__isnull=True).last()
+        if progress is None:
+            return None
+        return f"{progress.gap:.2%}"
+
+
 admin.site.register(AcademicYear)
 admin.site.register(Assistant)
 admin.site.register(AssistedCourse)
 admin.site.register(Chair, ChairAdmin)
 admin.site.register(Classroom)
 admin.site.register(Course, CourseAdmin)
+admin.site.register(CourseConflict, CourseConflictAdmin)
 admin.site.register(Department)
 admin.site.register(Enrollment, EnrollmentAdmin)
 admin.site.register(Exam, ExamAdmin)
@@ -74,6 +128,7 @@ admin.site.register(Layout)
 admin.site.register(NoExam)
 admin.site.register(Offering, OfferingAdmin)
 admin.site.register(Sitting)
+admin.site.register(SolverRun, SolverRunAdmin)
 admin.site.register(Student)
 admin.site.register(Period)
 admin.site.register(TimeCode)
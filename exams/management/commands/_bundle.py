@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+
+from django.core.management.base import CommandError
+
+# The names solve_bundle.py reads and writes in a bundle directory.
+BUNDLE_FILE = "bundle.json"
+SOLUTION_FILE = "solution.json"
+
+
+def input_hash(*parts):
+    # The hash of the database rows a bundle is built from, which --import
+    # compares with the database before writing the solution.
+    digest = hashlib.sha256()
+    digest.update(json.dumps(parts, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def write_bundle(path, command, digest, models, **settings):
+    # Each model is a dict with the PuLP or sparse problem under "prob",
+    # its name, the map from variable names to the keys the command reads
+    # the solution with and, optionally, the names of the variables of a
+    # starting solution under "initial".
+    os.makedirs(path, exist_ok=True)
+    if os.path.exists(os.path.join(path, SOLUTION_FILE)):
+        os.remove(os.path.join(path, SOLUTION_FILE))
+    entries = []
+    for model in models:
+        model = dict(model)
+        prob = model.pop("prob")
+        model["mps"] = f"{model['name']}.mps"
+        if hasattr(prob, "write_mps"):
+            prob.write_mps(os.path.join(path, model["mps"]))
+        else:
+            prob.writeMPS(os.path.join(path, model["mps"]))
+        entries.append(model)
+    _dump(
+        os.path.join(path, BUNDLE_FILE),
+        dict(settings, command=command, input_hash=digest, models=entries),
+    )
+
+
+def read_bundle(path, command):
+    bundle = _load(os.path.join(path, BUNDLE_FILE))
+    if bundle is None:
+        raise CommandError(f"There is no bundle in {path}.")
+    if bundle["command"] != command:
+        raise CommandError(
+            f"The bundle in {path} was exported by {bundle['command']}."
+        )
+    return bundle
+
+
+def check_bundle(bundle, digest):
+    if bundle["input_hash"] != digest:
+        raise CommandError(
+            "The database has changed since the bundle was exported. Export"
+            " and solve it again."
+        )
+
+
+def read_solution(path, bundle):
+    # The keys of the variables set to one in the solution of each model.
+    solution = _load(os.path.join(path, SOLUTION_FILE))
+    if solution is None:
+        raise CommandError(
+            f"The bundle in {path} has not been solved. Run solve_bundle.py"
+            f" on it first."
+        )
+    if solution["input_hash"] != bundle["input_hash"]:
+        raise CommandError(
+            f"The solution in {path} belongs to another export of the bundle."
+        )
+    chosen = {}
+    for model in bundle["models"]:
+        result = solution["models"].get(model["name"])
+        if result is None or not result["values"]:
+            raise CommandError(
+                f"No solution was found for {model['name']}"
+                f" ({result['status'] if result else 'not solved'})."
+            )
+        chosen[model["name"]] = [
+            model["variables"][name]
+            for name, value in result["values"].items()
+            if value > 0.5
+        ]
+    return chosen
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _dump(path, data):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from django.conf import settings
+
+MODEL_FILE = "model.mps"
+SOLUTION_FILE = "solution.json"
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def input_key(problem, df, no_exam, grid, penalties, formulation):
+    # The key covers everything the timetable is computed from: the
+    # enrollments, the courses without exams, the day/session grid, the
+    # penalty weights and the options that change the model or the engine.
+    digest = hashlib.sha256()
+    enrollments = (
+        df[["student_id", "course_code"]]
+        .drop_duplicates()
+        .sort_values(["course_code", "student_id"])
+    )
+    digest.update(enrollments.to_csv(index=False).encode())
+    digest.update(
+        json.dumps(
+            {
+                "problem": problem,
+                "no_exam": sorted(no_exam),
+                "days": list(grid["days"]),
+                "sessions": list(grid["sessions"]),
+                "daily_limit": grid["daily_limit"],
+                "penalties": penalties,
+                "formulation": formulation,
+            },
+            sort_keys=True,
+            default=str,
+        ).encode()
+    )
+    return digest.hexdigest()
+
+
+def entry_path(key, filename=None):
+    path = os.path.join(settings.SOLVER_CACHE_DIR, key)
+    if filename is None:
+        return path
+    os.makedirs(path, exist_ok=True)
+    # prune removes the entries that were not used for the longest time, so
+    # an entry is touched whenever a run reads or writes its files.
+    os.utime(path)
+    return os.path.join(path, filename)
+
+
+def load_solution(key):
+    data = _load(os.path.join(entry_path(key), SOLUTION_FILE))
+    if data is None:
+        return None
+    os.utime(entry_path(key))
+    return _decode(data["assignment"])
+
+
+def save_solution(key, problem, assignment):
+    _dump(
+        entry_path(key, SOLUTION_FILE),
+        {"problem": problem, "assignment": _encode(assignment)},
+    )
+
+
+def load_checkpoint(path):
+    data = _load(path)
+    if data is None:
+        return None
+    return _decode(data["assignment"]), data["objective"]
+
+
+def save_checkpoint(path, problem, assignment, objective):
+    _dump(
+        path,
+        {
+            "problem": problem,
+            "objective": float(objective),
+            "assignment": _encode(assignment),
+        },
+    )
+
+
+def _encode(assignment):
+    return [
+        (course, [int(day), int(session)])
+        for course, (day, session) in assignment.items()
+    ]
+
+
+def _decode(data):
+    return {course: tuple(slot) for course, slot in data}
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _dump(path, data):
+    # Written to a temporary file first so that an interrupted run never
+    # leaves a truncated file behind.
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def list_entries():
+    root = settings.SOLVER_CACHE_DIR
+    if not os.path.isdir(root):
+        return []
+    entries = []
+    for key in os.listdir(root):
+        path = os.path.join(root, key)
+        if not os.path.isdir(path):
+            continue
+        files = os.listdir(path)
+        problem = None
+        for name in (SOLUTION_FILE, CHECKPOINT_FILE):
+            if name in files:
+                problem = _load(os.path.join(path, name))["problem"]
+        entries.append(
+            {
+                "key": key,
+                "problem": problem,
+                "model": MODEL_FILE in files,
+                "solution": SOLUTION_FILE in files,
+                "checkpoint": CHECKPOINT_FILE in files,
+                "size": sum(
+                    os.path.getsize(os.path.join(path, name)) for name in files
+                ),
+                "modified": max(
+                    [os.path.getmtime(path)]
+                    + [os.path.getmtime(os.path.join(path, n)) for n in files]
+                ),
+            }
+        )
+    return sorted(entries, key=lambda entry: entry["modified"])
+
+
+def prune(older_than=None, max_size=None):
+    # Removes entries last used more than older_than seconds ago, then the
+    # oldest entries until the cache fits in max_size bytes.
+    entries = list_entries()
+    removed = []
+    if older_than is not None:
+        cutoff = time.time() - older_than
+        removed = [entry for entry in entries if entry["modified"] < cutoff]
+        entries = [entry for entry in entries if entry["modified"] >= cutoff]
+    if max_size is not None:
+        total = sum(entry["size"] for entry in entries)
+        while entries and total > max_size:
+            entry = entries.pop(0)
+            total -= entry["size"]
+            removed.append(entry)
+    for entry in removed:
+        shutil.rmtree(entry_path(entry["key"]))
+    return removed
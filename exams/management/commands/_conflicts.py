@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def build_conflict_matrix(df, course_list):
+    students = pd.Categorical(df["student_id"])
+    courses = pd.Categorical(df["course_code"], categories=course_list)
+    incidence = sparse.csr_matrix(
+        (
+            np.ones(len(df), dtype=np.int32),
+            (students.codes, courses.codes),
+        ),
+        shape=(len(students.categories), len(course_list)),
+    )
+    # A student enrolled in several sections of a course counts once.
+    incidence.data[:] = 1
+    conflicts = (incidence.T @ incidence).tocsr()
+    conflicts.setdiag(0)
+    conflicts.eliminate_zeros()
+    return conflicts
+
+
+def stored_conflict_matrix(course_list, pairs):
+    # The conflict matrix of the (course, course, shared students) rows of
+    # the CourseConflict table. Pairs with a course outside the list are
+    # left out.
+    index = {course: i for i, course in enumerate(course_list)}
+    rows, cols, weights = [], [], []
+    for course_a, course_b, shared_students in pairs:
+        if course_a in index and course_b in index:
+            rows += [index[course_a], index[course_b]]
+            cols += [index[course_b], index[course_a]]
+            weights += [shared_students, shared_students]
+    return sparse.csr_matrix(
+        (np.array(weights, dtype=np.int32), (rows, cols)),
+        shape=(len(course_list), len(course_list)),
+    )
+
+
+def conflict_pairs(course_list, conflicts):
+    upper = sparse.triu(conflicts, k=1).tocoo()
+    for i, j, weight in zip(upper.row, upper.col, upper.data):
+        yield course_list[i], course_list[j], int(weight)
+
+
+def heaviest_pairs(course_list, conflicts, n_pairs):
+    # The pairs sharing the most students, to start the lazy formulation
+    # with the conflicts that are most likely to bind.
+    upper = sparse.triu(conflicts, k=1).tocoo()
+    order = np.argsort(-upper.data, kind="stable")[:n_pairs]
+    return [
+        (course_list[upper.row[i]], course_list[upper.col[i]]) for i in order
+    ]
+
+
+def clashing_pairs(course_list, conflicts, assignment):
+    # Conflicting pairs of courses placed in the same slot.
+    slots = [assignment[course] for course in course_list]
+    upper = sparse.triu(conflicts, k=1).tocoo()
+    return [
+        (course_list[i], course_list[j])
+        for i, j in zip(upper.row, upper.col)
+        if slots[i] == slots[j]
+    ]
+
+
+def clique_cover(course_list, conflicts):
+    # Greedy edge clique cover: grow each clique from the course with the
+    # most uncovered conflicts, preferring members that cover new pairs.
+    neighbours = [
+        set(conflicts.indices[begin:end].tolist())
+        for begin, end in zip(conflicts.indptr[:-1], conflicts.indptr[1:])
+    ]
+    uncovered = [set(ns) for ns in neighbours]
+    cliques = []
+    order = sorted(range(len(course_list)), key=lambda i: -len(neighbours[i]))
+    for start in order:
+        while uncovered[start]:
+            clique = [start]
+            gains = {i: int(i in uncovered[start]) for i in neighbours[start]}
+            while gains:
+                member = max(
+                    gains, key=lambda i: (gains[i], len(neighbours[i]), -i)
+                )
+                clique.append(member)
+                gains = {
+                    i: gain + (member in uncovered[i])
+                    for i, gain in gains.items()
+                    if i in neighbours[member]
+                }
+            for i in clique:
+                uncovered[i].difference_update(clique)
+            cliques.append(tuple(course_list[i] for i in sorted(clique)))
+    return cliques
+
+
+def formulate_conflicts(course_list, conflicts, formulation):
+    # The groups of courses that get a conflict constraint in every slot.
+    if formulation == "clique":
+        return clique_cover(course_list, conflicts)
+    if formulation == "lazy":
+        return heaviest_pairs(course_list, conflicts, len(course_list))
+    return [(c1, c2) for c1, c2, _ in conflict_pairs(course_list, conflicts)]
+
+
+def max_clique(course_list, conflicts):
+    # Greedy clique from every course, largest degree first, adding the
+    # candidate with the most neighbours among the other candidates. Any
+    # clique is a lower bound on the number of slots a timetable needs.
+    neighbours = [
+        set(conflicts.indices[begin:end].tolist())
+        for begin, end in zip(conflicts.indptr[:-1], conflicts.indptr[1:])
+    ]
+    best = []
+    order = sorted(range(len(course_list)), key=lambda i: -len(neighbours[i]))
+    for start in order:
+        if len(neighbours[start]) < len(best):
+            break
+        clique = [start]
+        candidates = set(neighbours[start])
+        while candidates:
+            member = max(
+                candidates,
+                key=lambda i: (len(neighbours[i] & candidates), -i),
+            )
+            clique.append(member)
+            candidates &= neighbours[member]
+        if len(clique) > len(best):
+            best = clique
+    return [course_list[i] for i in sorted(best)]
+
+
+def conflict_neighbourhood(course_list, conflicts, courses):
+    idx = course_list.get_indexer(list(courses))
+    idx = idx[idx >= 0]
+    reached = np.asarray(conflicts[idx].sum(axis=0)).ravel() > 0
+    reached[idx] = True
+    return set(course_list[reached])
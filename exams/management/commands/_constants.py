@@ -67,6 +67,22 @@ REQUIRED_COLS = [
     "std_surname",
 ]
 
+RESIT_REQUIRED_COLS = [
+    "std_id",
+    "course_code",
+    "course_dept",
+    "course_section",
+    "status",
+    "grade",
+    "final",
+]
+
+# A student sits the resit of a course they failed or whose final they
+# missed.
+FAILING_GRADES = ["FD", "FF"]
+ABSENT_GRADES = ["GR"]
+FAILED_STATUSES = ["Kaldı"]
+
 TURKISH_CHAR = {
     ord("Ç"): "C",
     ord("Ğ"): "G",
@@ -0,0 +1,186 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+from django.core.management.base import CommandError
+from scipy.sparse.csgraph import connected_components
+
+from ._heuristics import SlotCapacity
+from ._presolve import restrict_capacity
+from ._timetabling import solve_timetable
+from ._timetabling import worker_options
+
+
+def split_components(course_list, conflicts, max_parts):
+    # Courses in different components of the conflict graph share no
+    # students. Components are packed into at most max_parts sub-problems,
+    # largest first, so that tiny components do not get a worker each.
+    n_components, labels = connected_components(conflicts, directed=False)
+    sizes = np.bincount(labels, minlength=n_components)
+    parts = [[] for _ in range(min(max_parts, n_components))]
+    part_sizes = np.zeros(len(parts), dtype=int)
+    for component in np.argsort(-sizes, kind="stable"):
+        part = int(np.argmin(part_sizes))
+        parts[part].append(component)
+        part_sizes[part] += sizes[component]
+    return [np.flatnonzero(np.isin(labels, part)) for part in parts]
+
+
+def _subproblem(
+    course_list, conflicts, conflict_groups, student_groups, idx, capacity
+):
+    courses = course_list[idx]
+    members = set(courses)
+    return (
+        courses,
+        conflicts[idx][:, idx],
+        [group for group in conflict_groups if group[0] in members],
+        student_groups[
+            [group[0] in members for group in student_groups.index]
+        ],
+    ), restrict_capacity(capacity, courses)
+
+
+def solve_decomposed(
+    name,
+    course_list,
+    conflicts,
+    conflict_groups,
+    student_groups,
+    days,
+    sessions,
+    daily_limit,
+    time_limit,
+    options,
+    fixed=None,
+    initial=None,
+    **capacity,
+):
+    # The days of every part are relabelled when merging, so courses cannot
+    # be kept at fixed slots or started from a given timetable.
+    if fixed or initial:
+        raise CommandError(
+            "Fixed courses and starting timetables are not supported with"
+            " --decompose."
+        )
+    workers = options["workers"] or os.cpu_count()
+    parts = split_components(course_list, conflicts, workers)
+    sub_options = worker_options(options, len(parts))
+    futures = []
+    with ProcessPoolExecutor(max_workers=len(parts)) as executor:
+        for number, idx in enumerate(parts):
+            args, sub_capacity = _subproblem(
+                course_list,
+                conflicts,
+                conflict_groups,
+                student_groups,
+                idx,
+                capacity,
+            )
+            futures.append(
+                executor.submit(
+                    solve_timetable,
+                    f"{name} part {number}",
+                    *args,
+                    days,
+                    sessions,
+                    daily_limit,
+                    time_limit,
+                    sub_options,
+                    **sub_capacity,
+                )
+            )
+        results = [future.result() for future in futures]
+    assignment = merge_parts(
+        results, course_list, conflicts, days, sessions, **capacity
+    )
+    if assignment is None:
+        raise CommandError(
+            "The partial timetables could not be merged within the slot"
+            " capacities."
+        )
+    return assignment
+
+
+def merge_parts(parts, course_list, conflicts, days, sessions, **capacity):
+    # The daily penalties of a part only depend on which of its courses
+    # share a day, so its days can be relabelled and the sessions within a
+    # day permuted without changing the objective. Each part's days are
+    # mapped to free days of the merged timetable where all of its sessions
+    # fit; courses of days that fit nowhere are placed one by one.
+    slots = list(product(days, sessions))
+    slot_index = {slot: i for i, slot in enumerate(slots)}
+    course_index = {course: i for i, course in enumerate(course_list)}
+    state = SlotCapacity(course_list, len(slots), **capacity)
+    merged = {}
+    leftovers = []
+    parts = sorted(
+        parts,
+        key=lambda part: -sum(state.sizes[course_index[c]] for c in part),
+    )
+    for part in parts:
+        by_day = {}
+        for course, (day, session) in part.items():
+            by_day.setdefault(day, {}).setdefault(session, []).append(
+                course_index[course]
+            )
+        free_days = list(days)
+        for day, by_session in sorted(
+            by_day.items(),
+            key=lambda item: -sum(
+                state.sizes[c] for group in item[1].values() for c in group
+            ),
+        ):
+            mapping = None
+            for target in free_days:
+                mapping = _fit_day(
+                    state,
+                    [slot_index[target, session] for session in sessions],
+                    list(by_session.values()),
+                )
+                if mapping is not None:
+                    free_days.remove(target)
+                    break
+            if mapping is None:
+                leftovers.extend(
+                    c for group in by_session.values() for c in group
+                )
+                continue
+            for group, slot in mapping:
+                for course in group:
+                    state.add(course, slot)
+                    merged[course] = slot
+    slot_days = np.array([days.index(day) for day, _ in slots])
+    for course in leftovers:
+        start, end = conflicts.indptr[course], conflicts.indptr[course + 1]
+        neighbours = conflicts.indices[start:end]
+        weights = conflicts.data[start:end]
+        feasible = state.feasible_slots(course)
+        day_cost = np.zeros(len(days))
+        for neighbour, weight in zip(neighbours, weights):
+            if neighbour in merged:
+                feasible[merged[neighbour]] = False
+                day_cost[slot_days[merged[neighbour]]] += weight
+        candidates = np.flatnonzero(feasible)
+        if not len(candidates):
+            return None
+        slot = min(candidates, key=lambda s: (day_cost[slot_days[s]], s))
+        state.add(course, slot)
+        merged[course] = slot
+    return {
+        course_list[course]: slots[slot] for course, slot in merged.items()
+    }
+
+
+def _fit_day(state, day_slots, groups):
+    mapping = []
+    free_slots = list(day_slots)
+    for group in sorted(groups, key=lambda g: -state.sizes[g].sum()):
+        fitting = [slot for slot in free_slots if state.fits_all(group, slot)]
+        if not fitting:
+            return None
+        slot = min(fitting, key=lambda s: (state.load[s], s))
+        free_slots.remove(slot)
+        mapping.append((group, slot))
+    return mapping
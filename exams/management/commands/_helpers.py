@@ -4,6 +4,7 @@ from django.contrib.auth.models import User
 from django.utils.text import slugify
 
 from exams.models import Course
+from exams.models import CourseConflict
 from exams.models import Department
 from exams.models import Enrollment
 from exams.models import Exam
@@ -12,9 +13,14 @@ from exams.models import Offering
 from exams.models import Period
 from exams.models import Student
 
+from ._constants import ABSENT_GRADES
 from ._constants import DEPARTMENT_LIST
 from ._constants import DEPTID_LONG_DICT
+from ._constants import FAILED_STATUSES
+from ._constants import FAILING_GRADES
 from ._constants import TURKISH_CHAR
+from ._conflicts import build_conflict_matrix
+from ._conflicts import conflict_pairs
 
 
 def slugify_tr(name):
@@ -241,6 +247,78 @@ def add_enrollments_to_db(df, academic_year):
     Enrollment.objects.bulk_create(objs)
 
 
+def add_course_conflicts_to_db(periods):
+    # Rebuilds the conflicts of the periods after bulk changes to their
+    # enrollments, which do not send the signals that keep them current.
+    for period in periods:
+        CourseConflict.objects.filter(period=period).delete()
+        df = pd.DataFrame.from_records(
+            Enrollment.objects.filter(exam__period=period).values_list(
+                "student", "exam__offering__course"
+            ),
+            columns=["student_id", "course_code"],
+        )
+        course_list = sorted(df["course_code"].unique())
+        conflicts = build_conflict_matrix(df, course_list)
+        CourseConflict.objects.bulk_create(
+            [
+                CourseConflict(
+                    period=period,
+                    course_a_id=course_a,
+                    course_b_id=course_b,
+                    shared_students=shared_students,
+                )
+                for course_a, course_b, shared_students in conflict_pairs(
+                    course_list, conflicts
+                )
+            ],
+            batch_size=500,
+        )
+
+
+def resit_roster(df):
+    grade = df["grade"].astype(str).str.strip().str.upper()
+    status = df["status"].astype(str).str.strip()
+    absent = df["final"].isna() | grade.isin(ABSENT_GRADES)
+    failed = grade.isin(FAILING_GRADES) | status.isin(FAILED_STATUSES)
+    return df[absent | failed]
+
+
+def prune_resit_enrollments_in_db(roster, academic_year):
+    # Resit enrollments are created for every student by load_data. Those
+    # of students who are not on the roster are deleted.
+    period = Period.objects.get(academic_year=academic_year, period="resit")
+    enrollments = pd.DataFrame.from_records(
+        Enrollment.objects.filter(exam__period=period).values_list(
+            "pk",
+            "student__user__username",
+            "exam__offering__course__code",
+            "exam__offering__department__code",
+            "exam__offering__section",
+        ),
+        columns=[
+            "pk",
+            "std_id",
+            "course_code",
+            "course_dept",
+            "course_section",
+        ],
+    )
+    keys = ["std_id", "course_code", "course_dept", "course_section"]
+    roster = roster[keys].astype(str).drop_duplicates()
+    eligible = (
+        enrollments.astype({key: str for key in keys})
+        .merge(roster, on=keys, how="left", indicator=True)["_merge"]
+        .eq("both")
+        .to_numpy()
+    )
+    removed = enrollments.loc[~eligible, "pk"].tolist()
+    # Deleted in batches to stay under the query parameter limit of SQLite.
+    for start in range(0, len(removed), 900):
+        Enrollment.objects.filter(pk__in=removed[start:start + 900]).delete()
+    return int(eligible.sum()), len(removed)
+
+
 def read_excel_file(file_name):
     import xlrd
 
@@ -0,0 +1,326 @@
+import math
+import random
+import time
+from itertools import product
+
+import numpy as np
+from scipy import sparse
+
+from ._model import HARD_PENALTY
+from ._model import SOFT_PENALTY
+from ._model import small_course_limit
+
+
+class SlotCapacity:
+    def __init__(
+        self,
+        course_list,
+        n_slots,
+        course_sizes=None,
+        max_size=None,
+        large_courses=(),
+        small_courses=(),
+        small_limit=None,
+    ):
+        n = len(course_list)
+        if course_sizes is None:
+            self.sizes = np.zeros(n)
+            self.max_size = np.inf
+        else:
+            self.sizes = np.asarray(
+                course_sizes.reindex(course_list), dtype=float
+            )
+            self.max_size = max_size
+        self.large = np.isin(
+            np.asarray(course_list), np.asarray(large_courses)
+        )
+        self.small = np.isin(
+            np.asarray(course_list), np.asarray(small_courses)
+        )
+        limit = small_course_limit(large_courses, small_limit)
+        self.small_limit = np.inf if limit is None else limit
+        self.load = np.zeros(n_slots)
+        self.large_count = np.zeros(n_slots, dtype=int)
+        self.small_count = np.zeros(n_slots, dtype=int)
+
+    def add(self, course, slot, sign=1):
+        self.load[slot] += sign * self.sizes[course]
+        self.large_count[slot] += sign * self.large[course]
+        self.small_count[slot] += sign * self.small[course]
+
+    def remove(self, course, slot):
+        self.add(course, slot, sign=-1)
+
+    def feasible_slots(self, course):
+        feasible = self.load + self.sizes[course] <= self.max_size
+        if self.large[course]:
+            feasible &= self.small_count == 0
+        if self.small[course]:
+            feasible &= (self.large_count == 0) & (
+                self.small_count < self.small_limit
+            )
+        return feasible
+
+    def fits(self, course, slot, leaving=None):
+        load = self.load[slot] + self.sizes[course]
+        large_count = self.large_count[slot]
+        small_count = self.small_count[slot]
+        if leaving is not None:
+            load -= self.sizes[leaving]
+            large_count -= self.large[leaving]
+            small_count -= self.small[leaving]
+        if load > self.max_size:
+            return False
+        if self.large[course] and small_count > 0:
+            return False
+        if self.small[course] and (
+            large_count > 0 or small_count >= self.small_limit
+        ):
+            return False
+        return True
+
+    def fits_all(self, courses, slot):
+        load = self.load[slot] + self.sizes[courses].sum()
+        large_count = self.large_count[slot] + self.large[courses].sum()
+        small_count = self.small_count[slot] + self.small[courses].sum()
+        if load > self.max_size:
+            return False
+        if large_count and small_count:
+            return False
+        return small_count <= self.small_limit
+
+
+def dsatur(course_list, conflicts, days, sessions, fixed=None, **capacity):
+    # Colour the conflict graph with (day, session) slots, picking the most
+    # saturated course first and the slot that puts the fewest shared
+    # students on the same day. Large courses go first as they cannot share
+    # a slot with small ones. Courses in fixed keep their slots. Returns None
+    # if a course cannot be placed.
+    slots = list(product(days, sessions))
+    slot_index = {slot: i for i, slot in enumerate(slots)}
+    slot_days = np.array([days.index(day) for day, _ in slots])
+    n = len(course_list)
+    degree = np.diff(conflicts.indptr)
+    state = SlotCapacity(course_list, len(slots), **capacity)
+
+    slot_of = np.full(n, -1)
+    saturation = [set() for _ in range(n)]
+    for course, slot in (fixed or {}).items():
+        course = course_list.get_loc(course)
+        slot_of[course] = slot_index[slot]
+        state.add(course, slot_of[course])
+        start, end = conflicts.indptr[course], conflicts.indptr[course + 1]
+        for neighbour in conflicts.indices[start:end]:
+            saturation[neighbour].add(slot_of[course])
+    for _ in range(n - len(fixed or {})):
+        uncoloured = np.flatnonzero(slot_of < 0)
+        course = max(
+            uncoloured,
+            key=lambda i: (
+                state.large[i],
+                len(saturation[i]),
+                degree[i],
+                state.sizes[i],
+                -i,
+            ),
+        )
+        start, end = conflicts.indptr[course], conflicts.indptr[course + 1]
+        neighbours = conflicts.indices[start:end]
+        weights = conflicts.data[start:end]
+        placed = slot_of[neighbours] >= 0
+        day_cost = np.bincount(
+            slot_days[slot_of[neighbours[placed]]],
+            weights=weights[placed],
+            minlength=len(days),
+        )
+        feasible = state.feasible_slots(course)
+        feasible[list(saturation[course])] = False
+        candidates = np.flatnonzero(feasible)
+        if not len(candidates):
+            return None
+        slot = min(
+            candidates,
+            key=lambda s: (day_cost[slot_days[s]], state.load[s], s),
+        )
+        slot_of[course] = slot
+        state.add(course, slot)
+        for neighbour in neighbours:
+            saturation[neighbour].add(slot)
+    return {course: slots[slot] for course, slot in zip(course_list, slot_of)}
+
+
+def daily_penalties(daily_limit, sessions):
+    # Cost of a student having a given number of exams in one day, matching
+    # the soft and hard penalties of the MIP. Loads the MIP cannot represent
+    # are priced high enough to be driven out first.
+    penalties = np.zeros(len(sessions) + 2)
+    penalties[daily_limit + 1 :] = SOFT_PENALTY
+    penalties[daily_limit + 2 :] = SOFT_PENALTY + HARD_PENALTY
+    penalties[daily_limit + 3 :] = 10000
+    return penalties
+
+
+def timetable_cost(assignment, student_groups, days, sessions, daily_limit):
+    penalties = daily_penalties(daily_limit, sessions)
+    day_index = {day: i for i, day in enumerate(days)}
+    cost = 0.0
+    for courses, weight in student_groups.items():
+        loads = np.bincount(
+            [day_index[assignment[course][0]] for course in courses],
+            minlength=len(days),
+        )
+        cost += weight * penalties[loads].sum()
+    return cost
+
+
+def anneal(
+    course_list,
+    conflicts,
+    student_groups,
+    days,
+    sessions,
+    daily_limit,
+    initial,
+    time_limit,
+    seed=27,
+    fixed=None,
+    checkpoint=None,
+    checkpoint_interval=600,
+    stop=None,
+    **capacity
+):
+    # Simulated annealing over course -> slot moves and swaps. Hard
+    # constraints are never violated; only the daily load penalties of the
+    # student groups are evaluated, incrementally for the groups involved.
+    # Courses in fixed are never moved. checkpoint is called with the best
+    # timetable and its cost at most every checkpoint_interval seconds. The
+    # search ends early once stop returns True.
+    rng = random.Random(seed)
+    slots = list(product(days, sessions))
+    slot_index = {slot: i for i, slot in enumerate(slots)}
+    slot_days = np.array([days.index(day) for day, _ in slots])
+    n = len(course_list)
+    state = SlotCapacity(course_list, len(slots), **capacity)
+
+    course_index = {course: i for i, course in enumerate(course_list)}
+    rows, cols = [], []
+    for group, courses in enumerate(student_groups.index):
+        rows.extend([group] * len(courses))
+        cols.extend(course_index[course] for course in courses)
+    membership = sparse.csc_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=(len(student_groups), n)
+    )
+    course_groups = [
+        membership.indices[start:end]
+        for start, end in zip(membership.indptr[:-1], membership.indptr[1:])
+    ]
+    weights = np.asarray(student_groups, dtype=float)
+    penalties = daily_penalties(daily_limit, sessions)
+
+    slot_of = np.array([slot_index[initial[course]] for course in course_list])
+    movable = np.ones(n, dtype=bool)
+    movable[course_list.get_indexer(list(fixed or {}))] = False
+    movable_courses = np.flatnonzero(movable)
+    if not len(movable_courses):
+        return dict(initial)
+    for course, slot in enumerate(slot_of):
+        state.add(course, slot)
+    day_of = slot_days[slot_of]
+    loads = np.zeros((len(student_groups), len(days)), dtype=int)
+    pairs = membership.tocoo()
+    np.add.at(loads, (pairs.row, day_of[pairs.col]), 1)
+    neighbours = [
+        conflicts.indices[start:end]
+        for start, end in zip(conflicts.indptr[:-1], conflicts.indptr[1:])
+    ]
+
+    def move_delta(course, old_day, new_day):
+        if old_day == new_day:
+            return 0.0
+        groups = course_groups[course]
+        old = loads[groups, old_day]
+        new = loads[groups, new_day]
+        return weights[groups] @ (
+            penalties[old - 1]
+            - penalties[old]
+            + penalties[new + 1]
+            - penalties[new]
+        )
+
+    def apply_move(course, slot):
+        old_slot = slot_of[course]
+        state.remove(course, old_slot)
+        state.add(course, slot)
+        groups = course_groups[course]
+        loads[groups, slot_days[old_slot]] -= 1
+        loads[groups, slot_days[slot]] += 1
+        slot_of[course] = slot
+
+    def clashes(course, slot, ignore=None):
+        occupied = slot_of[neighbours[course]] == slot
+        if ignore is not None:
+            occupied &= neighbours[course] != ignore
+        return occupied.any()
+
+    cost = float(weights @ penalties[loads].sum(axis=1))
+    best_cost, best_slots = cost, slot_of.copy()
+    start_temperature, end_temperature = 20.0, 0.05
+    started = time.monotonic()
+    saved_at, saved_cost = started, best_cost
+    temperature = start_temperature
+    iteration = 0
+    while True:
+        iteration += 1
+        if iteration % 1000 == 0:
+            now = time.monotonic()
+            progress = (now - started) / time_limit
+            if progress >= 1 or best_cost == 0 or (stop and stop()):
+                break
+            if (
+                checkpoint is not None
+                and best_cost < saved_cost
+                and now - saved_at >= checkpoint_interval
+            ):
+                checkpoint(
+                    dict(zip(course_list, (slots[s] for s in best_slots))),
+                    best_cost,
+                )
+                saved_at, saved_cost = now, best_cost
+            temperature = (
+                start_temperature
+                * (end_temperature / start_temperature) ** progress
+            )
+        course = movable_courses[rng.randrange(len(movable_courses))]
+        old_slot = slot_of[course]
+        slot = rng.randrange(len(slots) - 1)
+        slot += slot >= old_slot
+        if not clashes(course, slot) and state.fits(course, slot):
+            delta = move_delta(course, slot_days[old_slot], slot_days[slot])
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                apply_move(course, slot)
+                cost += delta
+        else:
+            occupants = np.flatnonzero((slot_of == slot) & movable)
+            if not len(occupants):
+                continue
+            other = occupants[rng.randrange(len(occupants))]
+            if (
+                clashes(course, slot, ignore=other)
+                or clashes(other, old_slot, ignore=course)
+                or not state.fits(course, slot, leaving=other)
+                or not state.fits(other, old_slot, leaving=course)
+            ):
+                continue
+            delta = move_delta(course, slot_days[old_slot], slot_days[slot])
+            apply_move(course, slot)
+            delta += move_delta(other, slot_days[slot], slot_days[old_slot])
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                apply_move(other, old_slot)
+                cost += delta
+            else:
+                apply_move(course, old_slot)
+        if cost < best_cost - 1e-9:
+            best_cost, best_slots = cost, slot_of.copy()
+    return {
+        course: slots[slot] for course, slot in zip(course_list, best_slots)
+    }
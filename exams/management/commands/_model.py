@@ -0,0 +1,293 @@
+from itertools import product
+
+from pulp import LpInteger
+from pulp import LpMinimize
+from pulp import LpProblem
+from pulp import LpVariable
+from pulp import lpSum
+from pulp import value
+
+SOFT_PENALTY = 1
+HARD_PENALTY = 100
+# Small courses that can share a slot when the problem has large courses.
+SMALL_LIMIT = 20
+
+
+def small_course_limit(large_courses, small_limit=None):
+    # A part of a problem is given the limit of the full problem in
+    # small_limit, as it may have no large courses of its own.
+    if small_limit is not None:
+        return small_limit
+    return SMALL_LIMIT if len(large_courses) else None
+
+
+def build_model(
+    name,
+    course_list,
+    conflict_groups,
+    student_groups,
+    days,
+    sessions,
+    daily_limit,
+    course_sizes=None,
+    max_size=None,
+    large_courses=(),
+    small_courses=(),
+    small_limit=None,
+):
+    prob = LpProblem(name, LpMinimize)
+    exam = LpVariable.dicts(
+        "course assignment", (course_list, days, sessions), 0, 1, LpInteger
+    )
+    groups = range(len(student_groups))
+    daily_soft_penalty = LpVariable.dicts(
+        "daily soft penalty", (groups, days), 0, 1, LpInteger
+    )
+    daily_hard_penalty = LpVariable.dicts(
+        "daily hard penalty", (groups, days), 0, 1, LpInteger
+    )
+    for courses in conflict_groups:
+        for day, session in product(days, sessions):
+            prob += (
+                lpSum(exam[course][day][session] for course in courses) <= 1
+            )
+    for group, courses in enumerate(student_groups.index):
+        for day in days:
+            prob += (
+                (
+                    lpSum(
+                        exam[course][day][session]
+                        for session in sessions
+                        for course in courses
+                    )
+                )
+                <= daily_limit
+                + daily_soft_penalty[group][day]
+                + daily_hard_penalty[group][day]
+            )
+    for course in course_list:
+        prob += (
+            lpSum(
+                exam[course][day][session]
+                for day, session in product(days, sessions)
+            )
+            == 1
+        )
+    if course_sizes is not None:
+        limit = small_course_limit(large_courses, small_limit)
+        for day, session in product(days, sessions):
+            prob += (
+                lpSum(
+                    exam[course][day][session] * course_sizes[course]
+                    for course in course_list
+                )
+                <= max_size
+            )
+        for day, session in product(days, sessions):
+            for large_course in large_courses:
+                prob += lpSum(
+                    exam[small_course][day][session]
+                    for small_course in small_courses
+                ) <= limit * (1 - exam[large_course][day][session])
+            if (
+                not len(large_courses)
+                and limit is not None
+                and len(small_courses)
+            ):
+                prob += (
+                    lpSum(
+                        exam[small_course][day][session]
+                        for small_course in small_courses
+                    )
+                    <= limit
+                )
+
+            if len(small_courses):
+                prob += (
+                    lpSum(
+                        exam[course][day][session] * course_sizes[course]
+                        for course in small_courses
+                    )
+                    <= max_size
+                )
+
+    prob += lpSum(
+        weight
+        * (
+            daily_soft_penalty[group][day] * SOFT_PENALTY
+            + daily_hard_penalty[group][day] * HARD_PENALTY
+        )
+        for group, weight in enumerate(student_groups)
+        for day in days
+    )
+    return prob, exam, (daily_soft_penalty, daily_hard_penalty)
+
+
+def build_day_model(
+    name,
+    course_list,
+    conflict_groups,
+    student_groups,
+    days,
+    n_sessions,
+    daily_limit,
+    course_sizes=None,
+    max_size=None,
+    large_courses=(),
+    small_courses=(),
+    small_limit=None,
+):
+    # The model of build_model with courses assigned to days only. A day
+    # can hold as many courses of a conflict clique as it has sessions, and
+    # as many students and small courses as its sessions together. The
+    # daily penalties are the same as in the full model.
+    prob = LpProblem(name, LpMinimize)
+    course_day = LpVariable.dicts(
+        "course day", (course_list, days), 0, 1, LpInteger
+    )
+    groups = range(len(student_groups))
+    daily_soft_penalty = LpVariable.dicts(
+        "daily soft penalty", (groups, days), 0, 1, LpInteger
+    )
+    daily_hard_penalty = LpVariable.dicts(
+        "daily hard penalty", (groups, days), 0, 1, LpInteger
+    )
+    for courses in conflict_groups:
+        if len(courses) <= n_sessions:
+            continue
+        for day in days:
+            prob += (
+                lpSum(course_day[course][day] for course in courses)
+                <= n_sessions
+            )
+    for group, courses in enumerate(student_groups.index):
+        for day in days:
+            prob += (
+                lpSum(course_day[course][day] for course in courses)
+                <= daily_limit
+                + daily_soft_penalty[group][day]
+                + daily_hard_penalty[group][day]
+            )
+    for course in course_list:
+        prob += lpSum(course_day[course][day] for day in days) == 1
+    if course_sizes is not None:
+        for day in days:
+            prob += (
+                lpSum(
+                    course_day[course][day] * course_sizes[course]
+                    for course in course_list
+                )
+                <= max_size * n_sessions
+            )
+        limit = small_course_limit(large_courses, small_limit)
+        if limit is not None and len(small_courses):
+            for day in days:
+                prob += (
+                    lpSum(course_day[course][day] for course in small_courses)
+                    <= limit * n_sessions
+                )
+    prob += lpSum(
+        weight
+        * (
+            daily_soft_penalty[group][day] * SOFT_PENALTY
+            + daily_hard_penalty[group][day] * HARD_PENALTY
+        )
+        for group, weight in enumerate(student_groups)
+        for day in days
+    )
+    return prob, course_day, (daily_soft_penalty, daily_hard_penalty)
+
+
+def add_conflicts(prob, exam, groups, days, sessions):
+    # The courses of a group cannot all share a slot.
+    for courses in groups:
+        for day, session in product(days, sessions):
+            prob += (
+                lpSum(exam[course][day][session] for course in courses)
+                <= len(courses) - 1
+            )
+
+
+def load_model(path, course_list, n_groups, days, sessions):
+    # Reads a model written by build_model back from an MPS file and
+    # rebuilds its variable dicts from the names PuLP gave the variables.
+    variables, prob = LpProblem.fromMPS(path)
+
+    def lookup(name, *index):
+        return variables[LpVariable("_".join(map(str, (name,) + index))).name]
+
+    exam = {
+        course: {
+            day: {
+                session: lookup("course assignment", course, day, session)
+                for session in sessions
+            }
+            for day in days
+        }
+        for course in course_list
+    }
+    penalties = tuple(
+        {
+            group: {day: lookup(name, group, day) for day in days}
+            for group in range(n_groups)
+        }
+        for name in ("daily soft penalty", "daily hard penalty")
+    )
+    return prob, exam, penalties
+
+
+def set_initial_values(
+    exam, penalties, assignment, student_groups, days, sessions, daily_limit
+):
+    for course, slots in exam.items():
+        for day, session in product(days, sessions):
+            slots[day][session].setInitialValue(
+                int(assignment[course] == (day, session))
+            )
+    daily_soft_penalty, daily_hard_penalty = penalties
+    for group, courses in enumerate(student_groups.index):
+        for day in days:
+            load = sum(assignment[course][0] == day for course in courses)
+            excess = load - daily_limit
+            daily_soft_penalty[group][day].setInitialValue(int(excess >= 1))
+            daily_hard_penalty[group][day].setInitialValue(int(excess >= 2))
+
+
+def set_initial_days(
+    course_day, penalties, assignment, student_groups, days, daily_limit
+):
+    for course, course_days in course_day.items():
+        for day in days:
+            course_days[day].setInitialValue(int(assignment[course][0] == day))
+    daily_soft_penalty, daily_hard_penalty = penalties
+    for group, courses in enumerate(student_groups.index):
+        for day in days:
+            load = sum(assignment[course][0] == day for course in courses)
+            excess = load - daily_limit
+            daily_soft_penalty[group][day].setInitialValue(int(excess >= 1))
+            daily_hard_penalty[group][day].setInitialValue(int(excess >= 2))
+
+
+def fix_courses(exam, fixed, days, sessions):
+    for course, slot in fixed.items():
+        for day, session in product(days, sessions):
+            variable = exam[course][day][session]
+            variable.lowBound = variable.upBound = int(slot == (day, session))
+
+
+def read_assignment(exam, days, sessions):
+    assignment = {}
+    for course, slots in exam.items():
+        for day, session in product(days, sessions):
+            if abs(value(slots[day][session])) > 0.01:
+                assignment[course] = (day, session)
+    return assignment
+
+
+def read_days(course_day, days):
+    course_days = {}
+    for course, variables in course_day.items():
+        for day in days:
+            if abs(value(variables[day])) > 0.01:
+                course_days[course] = day
+    return course_days
@@ -0,0 +1,234 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+from itertools import product
+from multiprocessing import Manager
+from threading import Timer
+
+from django.core.management.base import CommandError
+from pulp import PulpSolverError
+
+from ._conflicts import formulate_conflicts
+from ._heuristics import dsatur
+from ._heuristics import timetable_cost
+from ._solvers import SOLVERS
+from ._solvers import get_solver
+from ._timetabling import solve_timetable
+from ._timetabling import worker_options
+
+# Seconds between the rounds of the MIP configurations, after which they
+# pick up the best timetable found by any configuration. Every round starts
+# the solver over, so they are long. Annealing runs on and offers its best
+# timetable more often.
+SHARE_INTERVAL = 1800
+ANNEALING_SHARE_INTERVAL = 60
+
+
+class Incumbent:
+    # The best timetable of a portfolio, shared by the processes of its
+    # configurations. stop is called by a configuration that meets the gap
+    # target, and the solvers of the others are interrupted.
+    def __init__(self, lock, state):
+        self._lock = lock
+        self._state = state
+
+    def offer(self, assignment, objective):
+        with self._lock:
+            best = self._state.get("objective")
+            if best is None or objective < best - 1e-6:
+                self._state.update(
+                    assignment=dict(assignment), objective=float(objective)
+                )
+
+    def get(self):
+        return self._state.get("assignment"), self._state.get("objective")
+
+    def stop(self):
+        self._state["stopped"] = True
+
+    def stopped(self):
+        return self._state.get("stopped", False)
+
+
+def configurations(options, n):
+    # The configuration given by the options comes first, then annealing,
+    # the other conflict formulation and the other solvers, each repeated
+    # with the next seeds until there is one per worker. Annealing ignores
+    # classroom seating, so it is left out with --classrooms. The other
+    # solvers are only used if they are available.
+    get_solver(options)
+    solvers = [options["solver"]] + [
+        solver
+        for solver in SOLVERS
+        if solver != options["solver"] and _available(solver, options)
+    ]
+    formulations = [options["conflicts"]] + [
+        formulation
+        for formulation in ["clique", "pairwise"]
+        if formulation != options["conflicts"]
+    ]
+    variants = [
+        {"engine": "mip", "solver": solver, "conflicts": formulation}
+        for solver, formulation in product(solvers, formulations)
+    ]
+    if not options.get("seating"):
+        variants.insert(1, {"engine": "annealing"})
+    configs = []
+    for seed in count(options["seed"]):
+        configs += [dict(variant, seed=seed) for variant in variants]
+        if len(configs) >= n:
+            return configs[:n]
+
+
+def _available(solver, options):
+    try:
+        get_solver(dict(options, solver=solver))
+    except CommandError:
+        return False
+    return True
+
+
+def _label(config):
+    if config["engine"] == "annealing":
+        return f"annealing, seed {config['seed']}"
+    return f"{config['solver']}, {config['conflicts']}, seed {config['seed']}"
+
+
+def _solve_config(
+    name,
+    course_list,
+    conflicts,
+    conflict_groups,
+    student_groups,
+    days,
+    sessions,
+    daily_limit,
+    time_limit,
+    options,
+    fixed,
+    initial,
+    **capacity
+):
+    try:
+        assignment = solve_timetable(
+            name,
+            course_list,
+            conflicts,
+            conflict_groups,
+            student_groups,
+            days,
+            sessions,
+            daily_limit,
+            time_limit,
+            options,
+            fixed=fixed,
+            initial=initial,
+            **capacity
+        )
+    except (CommandError, PulpSolverError) as e:
+        # A configuration that fails or crashes has already shared its best
+        # timetable, and the others go on.
+        return str(e)
+    cost = timetable_cost(
+        assignment, student_groups, days, sessions, daily_limit
+    )
+    options["incumbent"].offer(assignment, cost)
+    # A timetable without penalties cannot be improved on, so the other
+    # configurations stop too.
+    if cost <= 1e-9:
+        options["incumbent"].stop()
+    return None
+
+
+def solve_portfolio(
+    name,
+    course_list,
+    conflicts,
+    conflict_groups,
+    student_groups,
+    days,
+    sessions,
+    daily_limit,
+    time_limit,
+    options,
+    fixed=None,
+    initial=None,
+    **capacity
+):
+    # Several configurations solve the same problem in parallel and share
+    # their best timetables. All of them stop when one proves the gap
+    # target (--mip-gap, optimality by default) or when the time limit
+    # runs out, and the best timetable of all is returned.
+    if initial is None:
+        initial = dsatur(
+            course_list, conflicts, days, sessions, fixed=fixed, **capacity
+        )
+    workers = options["workers"] or os.cpu_count()
+    configs = configurations(options, workers)
+    groups = {options["conflicts"]: conflict_groups}
+    time_limit = options["time_limit"] or time_limit
+    with Manager() as manager:
+        incumbent = Incumbent(manager.Lock(), manager.dict())
+        # The configurations stop themselves at the time limit, but one
+        # that overruns it is interrupted like when another one proves the
+        # gap target.
+        deadline = Timer(time_limit, incumbent.stop)
+        deadline.start()
+        futures = []
+        # Annealing stops at the time limit of the problem like the MIP
+        # configurations, not at its own default.
+        shared_options = worker_options(
+            options,
+            len(configs),
+            time_limit=time_limit,
+            incumbent=incumbent,
+        )
+        try:
+            with ProcessPoolExecutor(max_workers=len(configs)) as executor:
+                for config in configs:
+                    label = _label(config)
+                    formulation = config.get("conflicts", options["conflicts"])
+                    if formulation not in groups:
+                        groups[formulation] = formulate_conflicts(
+                            course_list, conflicts, formulation
+                        )
+                    sub_options = dict(
+                        shared_options,
+                        checkpoint_interval=(
+                            ANNEALING_SHARE_INTERVAL
+                            if config["engine"] == "annealing"
+                            else SHARE_INTERVAL
+                        ),
+                        solver_seed=config["seed"],
+                        **config
+                    )
+                    if config.get("solver") == "highs":
+                        sub_options["builder"] = "pulp"
+                    futures.append(
+                        executor.submit(
+                            _solve_config,
+                            f"{name} ({label})",
+                            course_list,
+                            conflicts,
+                            groups[formulation],
+                            student_groups,
+                            days,
+                            sessions,
+                            daily_limit,
+                            time_limit,
+                            sub_options,
+                            fixed,
+                            initial,
+                            **capacity
+                        )
+                    )
+                errors = [future.result() for future in futures]
+        finally:
+            deadline.cancel()
+        assignment = incumbent.get()[0]
+    if assignment is None:
+        raise CommandError(
+            f"No configuration of the portfolio found a timetable:"
+            f" {' '.join(sorted(set(filter(None, errors))))}"
+        )
+    return assignment
@@ -0,0 +1,166 @@
+import math
+
+import numpy as np
+
+from ._conflicts import max_clique
+from ._model import SMALL_LIMIT
+from ._model import small_course_limit
+
+
+def course_capacity(df):
+    # Slot capacity is the size of the largest course. A slot with a large
+    # course cannot have small courses.
+    course_sizes = df.groupby("course_code").size()
+    return dict(
+        course_sizes=course_sizes,
+        max_size=course_sizes.max(),
+        large_courses=course_sizes[lambda ser: ser > 400].index,
+        small_courses=course_sizes[lambda ser: ser <= 400].index,
+    )
+
+
+def restrict_capacity(capacity, courses):
+    # The capacity rules of a problem for a part of its courses. The part
+    # keeps the limit on small courses in a slot of the full problem.
+    sub_capacity = dict(capacity)
+    if "large_courses" in capacity:
+        sub_capacity["small_limit"] = small_course_limit(
+            capacity["large_courses"], capacity.get("small_limit")
+        )
+        for key in ("large_courses", "small_courses"):
+            sub_capacity[key] = capacity[key].intersection(courses)
+    return sub_capacity
+
+
+def group_students(df, min_courses):
+    signatures = df.groupby("student_id")["course_code"].apply(
+        lambda ser: tuple(sorted(set(ser)))
+    )
+    signatures = signatures[signatures.map(len) >= min_courses]
+    return signatures.value_counts(sort=False).sort_index()
+
+
+def changed_courses(old_df, new_df):
+    old = old_df.groupby("course_code")["student_id"].apply(frozenset)
+    new = new_df.groupby("course_code")["student_id"].apply(frozenset)
+    courses = old.index.union(new.index)
+    return {course for course in courses if old.get(course) != new.get(course)}
+
+
+def check_feasibility(
+    df,
+    course_list,
+    conflicts,
+    n_slots,
+    course_sizes=None,
+    max_size=None,
+    large_courses=(),
+    small_courses=(),
+):
+    # Necessary conditions for a timetable to exist, each returned as a
+    # message and whether it holds. None of them is sufficient, but all of
+    # them are checked in seconds, before a solve that may take hours.
+    checks = []
+    clique = max_clique(course_list, conflicts)
+    checks.append(
+        (
+            f"{len(clique)} courses share students pairwise and need"
+            f" different slots ({_listing(clique)}); {n_slots} slots are"
+            f" available.",
+            len(clique) <= n_slots,
+        )
+    )
+    exams = df.groupby("student_id")["course_code"].nunique()
+    overloaded = exams[exams > n_slots]
+    checks.append(
+        (
+            f"{len(overloaded)} students have more exams than the {n_slots}"
+            f" slots"
+            + (f" ({_listing(overloaded.index)})." if len(overloaded) else ".")
+            + f" The most exams a student has is {exams.max()}.",
+            overloaded.empty,
+        )
+    )
+    if course_sizes is None:
+        return checks
+    too_large = course_sizes[course_sizes > max_size]
+    checks.append(
+        (
+            f"{len(too_large)} courses are larger than the slot capacity of"
+            f" {max_size}"
+            + (f" ({_listing(too_large.index)})." if len(too_large) else "."),
+            too_large.empty,
+        )
+    )
+    needed = math.ceil(course_sizes.sum() / max_size)
+    checks.append(
+        (
+            f"{course_sizes.sum()} exam seats need at least {needed} slots"
+            f" of {max_size}; {n_slots} slots are available.",
+            needed <= n_slots,
+        )
+    )
+    if len(large_courses):
+        # A slot with a large course has no small courses, and a slot has
+        # at most SMALL_LIMIT small courses.
+        large_slots = math.ceil(course_sizes[large_courses].sum() / max_size)
+        small_slots = max(
+            math.ceil(course_sizes[small_courses].sum() / max_size),
+            math.ceil(len(small_courses) / SMALL_LIMIT),
+        )
+        checks.append(
+            (
+                f"{len(large_courses)} large courses need at least"
+                f" {large_slots} slots without small courses and"
+                f" {len(small_courses)} small courses need at least"
+                f" {small_slots} more; {n_slots} slots are available.",
+                large_slots + small_slots <= n_slots,
+            )
+        )
+    return checks
+
+
+def removable_courses(
+    course_list, conflicts, student_groups, n_slots, fixed=None
+):
+    # Courses that cannot change the objective, as none of their students
+    # has more exams than the daily limit, and that conflict with fewer
+    # courses than there are slots, so that they can be placed around a
+    # timetable of the other courses unless the slot capacity runs out.
+    # Courses without conflicts, whose students have no other exam, are
+    # the common case. Fixed courses are kept.
+    penalised = {
+        course for courses in student_groups.index for course in courses
+    }
+    degree = np.diff(conflicts.indptr)
+    return course_list[
+        [
+            course not in penalised
+            and degree[i] < n_slots
+            and course not in (fixed or {})
+            for i, course in enumerate(course_list)
+        ]
+    ]
+
+
+def reduce_problem(course_list, conflicts, conflict_groups, removed, capacity):
+    kept = course_list[~course_list.isin(removed)]
+    idx = course_list.get_indexer(kept)
+    members = set(kept)
+    sub_capacity = restrict_capacity(capacity, kept)
+    groups = [
+        group
+        for group in (
+            tuple(course for course in group if course in members)
+            for group in conflict_groups
+        )
+        if len(group) > 1
+    ]
+    return kept, conflicts[idx][:, idx], groups, sub_capacity
+
+
+def _listing(items, limit=10):
+    items = [str(item) for item in items]
+    if len(items) > limit:
+        return ", ".join(items[:limit]) + f" and {len(items) - limit} more"
+    return ", ".join(items)
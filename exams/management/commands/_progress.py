@@ -0,0 +1,334 @@
+import os
+import re
+import signal
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.utils import timezone
+from pulp import LpSolution
+from pulp import LpSolutionOptimal
+from pulp import LpStatusInfeasible
+from pulp import PulpSolverError
+
+from exams.models import AcademicYear
+from exams.models import SolverProgress
+from exams.models import SolverRun
+
+from ._solvers import get_solver
+
+NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+CBC_PATTERNS = [
+    re.compile(
+        rf"After (?P<nodes>\d+) nodes, \d+ on tree,"
+        rf" (?P<incumbent>{NUMBER}) best solution,"
+        rf" best possible (?P<bound>{NUMBER})"
+        rf" \((?P<seconds>{NUMBER}) seconds\)"
+    ),
+    re.compile(
+        rf"Integer solution of (?P<incumbent>{NUMBER}) found"
+        rf" .* and (?P<nodes>\d+) nodes"
+        rf" \((?P<seconds>{NUMBER}) seconds\)"
+    ),
+    re.compile(
+        rf"best objective (?P<incumbent>{NUMBER})"
+        rf"(?: \(best possible (?P<bound>{NUMBER})\))?,"
+        rf" took \d+ iterations and (?P<nodes>\d+) nodes"
+        rf" \((?P<seconds>{NUMBER}) seconds\)"
+    ),
+]
+# Progress is recorded when the incumbent or bound changes, and otherwise
+# at most this often.
+RECORD_INTERVAL = 10
+
+
+def parse_cbc(line):
+    for pattern in CBC_PATTERNS:
+        match = pattern.search(line)
+        if match:
+            progress = {
+                key: float(number)
+                for key, number in match.groupdict().items()
+                if number is not None
+            }
+            # CBC reports 1e+50 until it finds a solution.
+            if progress["incumbent"] >= 1e50:
+                del progress["incumbent"]
+            return progress
+    return None
+
+
+def parse_cplex(line):
+    # Node log lines end with the gap, and the incumbent and bound are the
+    # last two decimal numbers before it.
+    tokens = line.replace("*", " ").split()
+    if (
+        len(tokens) < 4
+        or not tokens[-1].endswith("%")
+        or not tokens[0].rstrip("+").isdigit()
+    ):
+        return None
+    decimals = [
+        float(token)
+        for token in tokens[2:-1]
+        if "." in token and re.fullmatch(NUMBER, token)
+    ]
+    if len(decimals) < 2:
+        return None
+    return {
+        "nodes": int(tokens[0].rstrip("+")),
+        "incumbent": decimals[-2],
+        "bound": decimals[-1],
+        "gap": float(tokens[-1][:-1]) / 100,
+    }
+
+
+PARSERS = {"cbc": parse_cbc, "cplex": parse_cplex}
+
+
+class ProgressMonitor(threading.Thread):
+    # Follows the log file of a running solver and stores the progress lines
+    # it understands. Runs in its own thread with its own connection. When
+    # a stopping rule is met or stop returns True, the solver is
+    # interrupted, after which it writes its best solution as on its time
+    # limit. Without a parser, the log is not followed and only stop is
+    # checked.
+    def __init__(
+        self,
+        solver_run,
+        parse,
+        log_path,
+        solver_path=None,
+        stall_time=None,
+        objective_target=None,
+        stop=None,
+    ):
+        super().__init__(daemon=True)
+        self.solver_run = solver_run
+        self.parse = parse
+        self.log_path = log_path
+        self.solver_path = solver_path
+        self.stall_time = stall_time
+        self.objective_target = objective_target
+        self.stop_requested = stop
+        self.offset = (timezone.now() - solver_run.started).total_seconds()
+        self.stopping = threading.Event()
+        self.last = None
+        self.started = time.monotonic()
+        self.best = self.improved = self.seen = self.reason = None
+        self.solver_clock = False
+
+    def run(self):
+        started = timezone.now()
+        position = 0
+        partial = ""
+        try:
+            while True:
+                stopping = self.stopping.wait(1)
+                if self.log_path and os.path.exists(self.log_path):
+                    with open(self.log_path) as f:
+                        f.seek(position)
+                        partial += f.read()
+                        position = f.tell()
+                lines = partial.split("\n")
+                partial = lines.pop()
+                elapsed = (timezone.now() - started).total_seconds()
+                for line in lines:
+                    progress = self.parse(line)
+                    if progress is not None:
+                        # CBC buffers its output, so the times it reports
+                        # are used where available.
+                        seconds = progress.pop("seconds", None)
+                        self.follow(progress.get("incumbent"), seconds)
+                        self.record(
+                            self.offset
+                            + (elapsed if seconds is None else seconds),
+                            progress,
+                        )
+                if stopping:
+                    break
+                if self.reason is None:
+                    self.reason = self.met_rule()
+                    if self.reason is not None:
+                        self.interrupt()
+        finally:
+            connection.close()
+
+    def record(self, elapsed, progress):
+        incumbent = progress.get("incumbent")
+        bound = progress.get("bound")
+        if self.last is not None:
+            incumbent = incumbent if incumbent is not None else self.last[0]
+            bound = bound if bound is not None else self.last[1]
+            if (incumbent, bound) == self.last[:2] and (
+                elapsed - self.last[2] < RECORD_INTERVAL
+            ):
+                return
+        gap = progress.get("gap")
+        if gap is None and incumbent is not None and bound is not None:
+            gap = abs(incumbent - bound) / max(abs(incumbent), 1e-10)
+        line = SolverProgress(
+            run=self.solver_run,
+            elapsed=elapsed,
+            incumbent=incumbent,
+            bound=bound,
+            gap=gap,
+            nodes=progress.get("nodes"),
+        )
+        if self.solver_run.pk is None:
+            self.solver_run.progress_lines.append(line)
+        else:
+            line.save()
+        self.last = (incumbent, bound, elapsed)
+
+    def follow(self, incumbent, seconds):
+        # A stall is timed by the solver's clock if it reports one, so that
+        # a log that arrives late does not stop a solver that is improving.
+        self.solver_clock = seconds is not None
+        self.seen = time.monotonic() - self.started
+        if self.solver_clock:
+            self.seen = seconds
+        if incumbent is not None and (
+            self.best is None or incumbent < self.best - 1e-9
+        ):
+            self.best = incumbent
+            self.improved = self.seen
+
+    def met_rule(self):
+        # The other configurations of a portfolio stop when one of them
+        # proves the gap target.
+        if self.stop_requested is not None and self.stop_requested():
+            return "portfolio"
+        if self.best is None:
+            return None
+        if (
+            self.objective_target is not None
+            and self.best <= self.objective_target + 1e-9
+        ):
+            return "objective target"
+        now = time.monotonic() - self.started
+        if self.solver_clock:
+            now = self.seen
+        if self.stall_time and now - self.improved >= self.stall_time:
+            return "stall"
+        return None
+
+    def interrupt(self):
+        # PuLP does not expose the solver process, so it is looked up among
+        # the children of this process. This needs Linux's /proc.
+        if not os.path.isdir("/proc"):
+            return
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    parent = int(f.read().rsplit(")", 1)[1].split()[1])
+                with open(f"/proc/{pid}/cmdline") as f:
+                    command = f.read().split("\0")[0]
+            except (OSError, IndexError, ValueError):
+                continue
+            if parent == os.getpid() and command == self.solver_path:
+                os.kill(int(pid), signal.SIGINT)
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+
+@contextmanager
+def solver_run(command, problem, options):
+    # With record off, the run is not saved and its progress lines are kept
+    # in progress_lines instead, so that no active academic year is needed.
+    record = options.get("record", True)
+    run = SolverRun(
+        command=command,
+        problem=problem,
+        solver=options["solver"],
+        threads=options["threads"],
+        started=timezone.now(),
+    )
+    if record:
+        run.academic_year = AcademicYear.objects.get(active=True)
+        run.save()
+    else:
+        run.progress_lines = []
+    try:
+        yield run
+    except BaseException:
+        run.status = "Failed"
+        raise
+    finally:
+        run.finished = timezone.now()
+        if record:
+            run.save()
+
+
+def solve_with_progress(prob, solver, run, options):
+    # The solver writes its log to a file that is followed while it runs.
+    # The HiGHS command line only logs to a file PuLP names itself, so its
+    # runs are recorded without progress.
+    if run.variables is None:
+        run.variables = prob.numVariables()
+        run.constraints = prob.numConstraints()
+    parse = PARSERS.get(options["solver"])
+    incumbent = options.get("incumbent")
+    stop = incumbent.stopped if incumbent is not None else None
+    reason = None
+    if parse is None and stop is None:
+        status = prob.solve(solver)
+    else:
+        log_path = None
+        if parse is not None:
+            handle, log_path = tempfile.mkstemp(
+                prefix=f"solver-run-{run.pk}-",
+                suffix=".log",
+                dir=options["workdir"],
+            )
+            os.close(handle)
+            solver.msg = False
+            solver.optionsDict["logPath"] = log_path
+        monitor = ProgressMonitor(
+            run,
+            parse,
+            log_path,
+            solver_path=solver.path,
+            stall_time=options["stall_time"],
+            objective_target=options["objective_target"],
+            stop=stop,
+        )
+        monitor.start()
+        try:
+            status = prob.solve(solver)
+        finally:
+            monitor.stop()
+            if log_path is not None:
+                os.remove(log_path)
+        reason = monitor.reason
+    run.status = LpSolution[prob.sol_status]
+    run.stop_reason = reason or _stop_reason(prob, options)
+    return status
+
+
+def solve_warm_started(prob, options, run, warm_start):
+    # The bundled CBC crashes on the MIP start of some models, even a
+    # feasible one, so a crashed warm-started solve is repeated without the
+    # start.
+    try:
+        return solve_with_progress(
+            prob, get_solver(options, warm_start=warm_start), run, options
+        )
+    except PulpSolverError:
+        if not warm_start:
+            raise
+    return solve_with_progress(prob, get_solver(options), run, options)
+
+
+def _stop_reason(prob, options):
+    if prob.sol_status == LpSolutionOptimal:
+        return "gap target" if options["mip_gap"] else "optimal"
+    if prob.status == LpStatusInfeasible:
+        return "infeasible"
+    return "time limit"
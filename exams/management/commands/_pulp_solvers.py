@@ -0,0 +1,45 @@
+import os
+
+from pulp import CPLEX_CMD
+from pulp import HiGHS_CMD
+from pulp import PULP_CBC_CMD
+
+# The solvers are built without Django, so that solve_bundle.py solves the
+# exported models with the same settings as the management commands.
+
+
+def make_solver(
+    solver,
+    threads=None,
+    time_limit=None,
+    mip_gap=None,
+    workdir=None,
+    warm_start=False,
+    seed=None,
+):
+    # Raises ValueError for settings the solver does not take, which the
+    # callers turn into their own errors.
+    kwargs = {"timeLimit": time_limit, "gapRel": mip_gap, "threads": threads}
+    kwargs = {key: value for key, value in kwargs.items() if value is not None}
+    if solver == "cplex":
+        seeded = [] if seed is None else [f"set randomseed {seed}"]
+        command = CPLEX_CMD(warmStart=warm_start, options=seeded, **kwargs)
+    elif solver == "cbc":
+        seeded = [] if seed is None else [f"randomCbcSeed {seed}"]
+        command = PULP_CBC_CMD(warmStart=warm_start, options=seeded, **kwargs)
+    else:
+        # The HiGHS command line only takes a time limit, a switch for
+        # parallel search and a seed.
+        if mip_gap is not None:
+            raise ValueError("--mip-gap is not supported by highs.")
+        parallel = ["--parallel on"] if (threads or 1) > 1 else []
+        seeded = [] if seed is None else [f"--random_seed {seed}"]
+        command = HiGHS_CMD(timeLimit=time_limit, options=parallel + seeded)
+    if not command.available():
+        raise ValueError(
+            f"The {solver} solver is not available on this machine."
+        )
+    if workdir:
+        os.makedirs(workdir, exist_ok=True)
+        command.tmpDir = workdir
+    return command
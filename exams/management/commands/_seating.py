@@ -0,0 +1,45 @@
+from bisect import bisect_left
+
+
+def fits_classrooms(sizes, rooms):
+    # Greedy packing of exams into classrooms, largest exam first: an exam
+    # takes the smallest free classroom it fits in, or else the largest free
+    # classroom and goes on with the rest of its students. If it succeeds,
+    # assign_classrooms has a solution as well; it may fail on slots that
+    # could still be seated.
+    free = sorted(rooms)
+    for size in sorted(sizes, reverse=True):
+        need = size
+        while need > 0:
+            if not free:
+                return False
+            i = bisect_left(free, need)
+            if i < len(free):
+                free.pop(i)
+                need = 0
+            else:
+                need -= free.pop()
+    return True
+
+
+def overfull_slots(assignment, sections, rooms):
+    # Courses whose exams cannot be seated together in one slot. Courses are
+    # dropped from each such slot while the rest still cannot be seated, so
+    # that the sets are small and cut off many timetables.
+    by_slot = {}
+    for course, slot in assignment.items():
+        by_slot.setdefault(slot, []).append(course)
+    overfull = []
+    for courses in by_slot.values():
+        if fits_classrooms(_sizes(courses, sections), rooms):
+            continue
+        for course in sorted(courses, key=lambda c: sum(sections[c])):
+            rest = [other for other in courses if other != course]
+            if not fits_classrooms(_sizes(rest, sections), rooms):
+                courses = rest
+        overfull.append(tuple(courses))
+    return overfull
+
+
+def _sizes(courses, sections):
+    return [size for course in courses for size in sections[course]]
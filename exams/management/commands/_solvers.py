@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import CommandError
+
+from ._pulp_solvers import make_solver
+
+SOLVERS = ["cplex", "cbc", "highs"]
+
+
+def add_solver_arguments(parser):
+    parser.add_argument("--solver", choices=SOLVERS, default="cplex")
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    parser.add_argument("--time-limit", type=int)
+    parser.add_argument("--mip-gap", type=float)
+    parser.add_argument("--stall-time", type=int)
+    parser.add_argument("--objective-target", type=float)
+    parser.add_argument("--workdir")
+
+
+def get_solver(options, time_limit=None, warm_start=False):
+    # The stopping rules follow the solver log, which HiGHS only writes
+    # when it has finished.
+    if options["solver"] == "highs" and (
+        options["stall_time"] or options["objective_target"] is not None
+    ):
+        raise CommandError(
+            "--stall-time and --objective-target are not supported by highs."
+        )
+    try:
+        return make_solver(
+            options["solver"],
+            threads=options["threads"],
+            time_limit=options["time_limit"] or time_limit,
+            mip_gap=options["mip_gap"],
+            workdir=options["workdir"],
+            warm_start=warm_start,
+            # Only the portfolio of schedule_exams sets a seed for the
+            # solver.
+            seed=options.get("solver_seed"),
+        )
+    except ValueError as e:
+        raise CommandError(str(e))
@@ -0,0 +1,485 @@
+import os
+import subprocess
+import xml.etree.ElementTree as et
+
+import numpy as np
+from pulp import COIN_CMD
+from pulp import CPLEX_CMD
+from pulp import LpStatusToSolution
+from pulp import PulpSolverError
+from scipy.sparse import coo_matrix
+from scipy.sparse import vstack
+
+from ._model import HARD_PENALTY
+from ._model import SOFT_PENALTY
+from ._model import small_course_limit
+
+# Characters PuLP replaces in variable names.
+ILLEGAL_CHARS = str.maketrans("-+[] ->/", "________")
+
+
+def variable_name(name, *index):
+    return "_".join(map(str, (name,) + index)).translate(ILLEGAL_CHARS)
+
+
+class SparseModel:
+    # The model of build_model assembled directly as a CSC matrix with row
+    # and column bounds, written to MPS and solved by the solver's command
+    # line without creating a PuLP object per variable and coefficient.
+    # Variables and constraints have the names PuLP would give them, so the
+    # two builders write interchangeable MPS files.
+    def __init__(
+        self,
+        name,
+        course_list,
+        conflict_groups,
+        student_groups,
+        days,
+        sessions,
+        daily_limit,
+        course_sizes=None,
+        max_size=None,
+        large_courses=(),
+        small_courses=(),
+        small_limit=None,
+    ):
+        self.name = name.translate(ILLEGAL_CHARS)
+        self.course_list = list(course_list)
+        self.days = list(days)
+        self.sessions = list(sessions)
+        n_courses = len(self.course_list)
+        n_days = len(self.days)
+        n_sessions = len(self.sessions)
+        n_slots = n_days * n_sessions
+        n_groups = len(student_groups)
+        self.n_exam = n_courses * n_slots
+        soft = self.n_exam
+        hard = soft + n_groups * n_days
+        n_columns = hard + n_groups * n_days
+        self.index = index = {
+            course: i for i, course in enumerate(self.course_list)
+        }
+        slots = np.arange(n_slots)
+
+        def members(groups):
+            sizes = [len(group) for group in groups]
+            courses = np.array(
+                [index[course] for group in groups for course in group],
+                dtype=np.int64,
+            )
+            return np.repeat(np.arange(len(groups)), sizes), courses
+
+        rows, columns, coefficients, lower, upper = [], [], [], [], []
+
+        def add(row, column, coefficient, row_lower, row_upper):
+            offset = sum(map(len, lower))
+            rows.append((offset + np.ravel(row)).astype(np.int32))
+            columns.append(np.ravel(column).astype(np.int32))
+            coefficients.append(
+                np.broadcast_to(coefficient, np.shape(row)).ravel()
+            )
+            lower.append(np.asarray(row_lower, dtype=float))
+            upper.append(np.asarray(row_upper, dtype=float))
+
+        # At most one course of a conflict group in a slot.
+        group, course = members(conflict_groups)
+        n_rows = len(conflict_groups) * n_slots
+        add(
+            group[:, None] * n_slots + slots,
+            course[:, None] * n_slots + slots,
+            1.0,
+            np.full(n_rows, -np.inf),
+            np.ones(n_rows),
+        )
+        # Exams of a student group on a day beyond the daily limit are
+        # penalized.
+        group, course = members(list(student_groups.index))
+        day = np.arange(n_days)[None, :, None]
+        session = np.arange(n_sessions)[None, None, :]
+        penalty = np.arange(n_groups * n_days)
+        n_rows = n_groups * n_days
+        add(
+            np.concatenate(
+                [
+                    np.broadcast_to(
+                        group[:, None, None] * n_days + day,
+                        (len(course), n_days, n_sessions),
+                    ).ravel(),
+                    penalty,
+                    penalty,
+                ]
+            ),
+            np.concatenate(
+                [
+                    (
+                        course[:, None, None] * n_slots
+                        + day * n_sessions
+                        + session
+                    ).ravel(),
+                    soft + penalty,
+                    hard + penalty,
+                ]
+            ),
+            np.concatenate(
+                [
+                    np.ones(len(course) * n_slots),
+                    -np.ones(2 * len(penalty)),
+                ]
+            ),
+            np.full(n_rows, -np.inf),
+            np.full(n_rows, daily_limit),
+        )
+        # Every course in exactly one slot.
+        course = np.arange(n_courses)
+        add(
+            np.broadcast_to(course[:, None], (n_courses, n_slots)),
+            course[:, None] * n_slots + slots,
+            1.0,
+            np.ones(n_courses),
+            np.ones(n_courses),
+        )
+        if course_sizes is not None:
+            sizes = np.array(
+                [course_sizes[course] for course in self.course_list],
+                dtype=float,
+            )
+            add(
+                np.broadcast_to(slots, (n_courses, n_slots)),
+                course[:, None] * n_slots + slots,
+                sizes[:, None] * np.ones(n_slots),
+                np.full(n_slots, -np.inf),
+                np.full(n_slots, max_size),
+            )
+            # A slot with a large course has no small courses, and the
+            # others have at most limit small courses.
+            limit = small_course_limit(large_courses, small_limit)
+            small = np.array(
+                [index[course] for course in small_courses], dtype=np.int64
+            )
+            large = np.array(
+                [index[course] for course in large_courses], dtype=np.int64
+            )
+            if len(large):
+                pair = slots[:, None] * len(large) + np.arange(len(large))
+                shape = (len(small),) + pair.shape
+                n_rows = pair.size
+                add(
+                    np.concatenate(
+                        [np.broadcast_to(pair, shape).ravel(), pair.ravel()]
+                    ),
+                    np.concatenate(
+                        [
+                            np.broadcast_to(
+                                (small[:, None] * n_slots + slots)[:, :, None],
+                                shape,
+                            ).ravel(),
+                            (large * n_slots + slots[:, None]).ravel(),
+                        ]
+                    ),
+                    np.concatenate(
+                        [np.ones(len(small) * n_rows), np.full(n_rows, limit)]
+                    ),
+                    np.full(n_rows, -np.inf),
+                    np.full(n_rows, limit),
+                )
+            elif limit is not None and len(small):
+                add(
+                    np.broadcast_to(slots, (len(small), n_slots)),
+                    small[:, None] * n_slots + slots,
+                    1.0,
+                    np.full(n_slots, -np.inf),
+                    np.full(n_slots, limit),
+                )
+            if len(small):
+                add(
+                    np.broadcast_to(slots, (len(small), n_slots)),
+                    small[:, None] * n_slots + slots,
+                    sizes[small][:, None] * np.ones(n_slots),
+                    np.full(n_slots, -np.inf),
+                    np.full(n_slots, max_size),
+                )
+        self.row_lower = np.concatenate(lower)
+        self.row_upper = np.concatenate(upper)
+        self.matrix = coo_matrix(
+            (
+                np.concatenate(coefficients),
+                (np.concatenate(rows), np.concatenate(columns)),
+            ),
+            shape=(len(self.row_lower), n_columns),
+        ).tocsc()
+        self.column_lower = np.zeros(n_columns)
+        self.column_upper = np.ones(n_columns)
+        self.integrality = np.ones(n_columns, dtype=bool)
+        weights = np.asarray(student_groups, dtype=float)
+        self.cost = np.zeros(n_columns)
+        self.cost[soft:hard] = np.repeat(weights, n_days) * SOFT_PENALTY
+        self.cost[hard:] = np.repeat(weights, n_days) * HARD_PENALTY
+        self.column_names = [
+            variable_name("course assignment", course, day, session)
+            for course in self.course_list
+            for day in self.days
+            for session in self.sessions
+        ] + [
+            variable_name(name, group, day)
+            for name in ("daily soft penalty", "daily hard penalty")
+            for group in range(n_groups)
+            for day in self.days
+        ]
+        self.columns = {name: j for j, name in enumerate(self.column_names)}
+        self.mps_path = None
+        self.initial = None
+        self.values = None
+        self.status = self.sol_status = 0
+
+    def numVariables(self):
+        return self.matrix.shape[1]
+
+    def numConstraints(self):
+        return self.matrix.shape[0]
+
+    def exam_columns(self, course):
+        start = self.index[course] * len(self.days)
+        return slice(
+            start * len(self.sessions),
+            (start + len(self.days)) * len(self.sessions),
+        )
+
+    def fix_courses(self, fixed):
+        for course, (day, session) in fixed.items():
+            columns = self.exam_columns(course)
+            bounds = np.zeros((len(self.days), len(self.sessions)))
+            bounds[self.days.index(day), self.sessions.index(session)] = 1
+            self.column_lower[columns] = bounds.ravel()
+            self.column_upper[columns] = bounds.ravel()
+
+    def add_conflicts(self, groups):
+        # The courses of a group cannot all share a slot.
+        n_slots = len(self.days) * len(self.sessions)
+        n_rows = len(groups) * n_slots
+        sizes = [len(courses) for courses in groups]
+        group = np.repeat(np.arange(len(groups)), sizes)
+        course = np.array(
+            [self.index[c] for courses in groups for c in courses],
+            dtype=np.int64,
+        )
+        slots = np.arange(n_slots)
+        added = coo_matrix(
+            (
+                np.ones(len(course) * n_slots),
+                (
+                    (group[:, None] * n_slots + slots).ravel(),
+                    (course[:, None] * n_slots + slots).ravel(),
+                ),
+            ),
+            shape=(n_rows, self.numVariables()),
+        )
+        self.matrix = vstack([self.matrix, added]).tocsc()
+        self.row_lower = np.concatenate(
+            [self.row_lower, np.full(n_rows, -np.inf)]
+        )
+        self.row_upper = np.concatenate(
+            [self.row_upper, np.repeat(np.array(sizes) - 1.0, n_slots)]
+        )
+        # The model has to be written again.
+        self.mps_path = None
+
+    def set_initial_values(self, assignment, student_groups, daily_limit):
+        initial = np.zeros(self.numVariables())
+        n_sessions = len(self.sessions)
+        for i, course in enumerate(self.course_list):
+            day, session = assignment[course]
+            initial[
+                (i * len(self.days) + self.days.index(day)) * n_sessions
+                + self.sessions.index(session)
+            ] = 1
+        n_penalties = len(student_groups) * len(self.days)
+        for group, courses in enumerate(student_groups.index):
+            for d, day in enumerate(self.days):
+                load = sum(assignment[course][0] == day for course in courses)
+                excess = load - daily_limit
+                column = self.n_exam + group * len(self.days) + d
+                initial[column] = int(excess >= 1)
+                initial[column + n_penalties] = int(excess >= 2)
+        self.initial = initial
+
+    def read_assignment(self):
+        exam = self.values[: self.n_exam].reshape(
+            len(self.course_list), len(self.days), len(self.sessions)
+        )
+        assignment = {}
+        for i, d, s in zip(*np.nonzero(np.abs(exam) > 0.01)):
+            assignment[self.course_list[i]] = (self.days[d], self.sessions[s])
+        return assignment
+
+    def objective_value(self):
+        return float(self.cost @ self.values)
+
+    def write_mps(self, path):
+        # Streamed column by column, so the file is never held in memory.
+        names = self.column_names
+        row_names = [f"_C{i + 1}" for i in range(self.numConstraints())]
+        with open(path, "w") as f:
+            f.write(f"*SENSE:Minimize\nNAME          {self.name}\nROWS\n")
+            f.write(" N  OBJ\n")
+            for name, row_lower, row_upper in zip(
+                row_names, self.row_lower, self.row_upper
+            ):
+                if row_lower == row_upper:
+                    sense = "E"
+                elif row_lower == -np.inf:
+                    sense = "L"
+                else:
+                    sense = "G"
+                f.write(f" {sense}  {name}\n")
+            f.write("COLUMNS\n")
+            indptr = self.matrix.indptr
+            indices = self.matrix.indices
+            data = self.matrix.data
+            integral = False
+            for j, name in enumerate(names):
+                if self.integrality[j] != integral:
+                    integral = self.integrality[j]
+                    marker = "INTORG" if integral else "INTEND"
+                    f.write(f"    MARK      'MARKER'     '{marker}'\n")
+                if self.cost[j]:
+                    f.write(f"    {name}  OBJ  {self.cost[j]:.12e}\n")
+                f.writelines(
+                    f"    {name}  {row_names[i]}  {coefficient:.12e}\n"
+                    for i, coefficient in zip(
+                        indices[indptr[j] : indptr[j + 1]].tolist(),
+                        data[indptr[j] : indptr[j + 1]].tolist(),
+                    )
+                )
+            if integral:
+                f.write("    MARK      'MARKER'     'INTEND'\n")
+            f.write("RHS\n")
+            rhs = np.where(
+                np.isfinite(self.row_upper), self.row_upper, self.row_lower
+            )
+            for i in np.nonzero(rhs)[0].tolist():
+                f.write(f"    RHS  {row_names[i]}  {rhs[i]:.12e}\n")
+            f.write("BOUNDS\n")
+            for j, name in enumerate(names):
+                lower, upper = self.column_lower[j], self.column_upper[j]
+                if lower == upper:
+                    f.write(f" FX BND  {name}  {upper:.12e}\n")
+                elif self.integrality[j] and (lower, upper) == (0, 1):
+                    f.write(f" BV BND  {name}\n")
+                else:
+                    if lower:
+                        f.write(f" LO BND  {name}  {lower:.12e}\n")
+                    f.write(f" UP BND  {name}  {upper:.12e}\n")
+            f.write("ENDATA\n")
+
+    def solve(self, solver):
+        # Takes a configured PuLP command line solver in place of an
+        # LpProblem's solve, and uses its options and temporary files.
+        if not solver.executable(solver.path):
+            raise PulpSolverError(f"Cannot execute {solver.path}")
+        tmp_mps, tmp_sol, tmp_mst = solver.create_tmp_files(
+            self.name, "mps", "sol", "mst"
+        )
+        mps_path = self.mps_path or tmp_mps
+        if self.mps_path is None:
+            self.write_mps(tmp_mps)
+        warm_start = (
+            solver.optionsDict.get("warmStart") and self.initial is not None
+        )
+        try:
+            if isinstance(solver, COIN_CMD):
+                self._solve_cbc(solver, mps_path, tmp_sol, tmp_mst, warm_start)
+            elif isinstance(solver, CPLEX_CMD):
+                self._solve_cplex(
+                    solver, mps_path, tmp_sol, tmp_mst, warm_start
+                )
+            else:
+                raise PulpSolverError(
+                    f"{type(solver).__name__} cannot solve a sparse model."
+                )
+        finally:
+            solver.delete_tmp_files(tmp_mps, tmp_sol, tmp_mst)
+        return self.status
+
+    def _solve_cbc(self, solver, mps_path, sol_path, mst_path, warm_start):
+        args = [solver.path, mps_path]
+        if warm_start:
+            with open(mst_path, "w") as f:
+                f.write("Stopped on time - objective value 0\n")
+                f.writelines(
+                    f"{j:>7} {name} {value:>15} {0:>23}\n"
+                    for j, (name, value) in enumerate(
+                        zip(self.column_names, self.initial.tolist())
+                    )
+                )
+            args += ["mips", mst_path]
+        if solver.timeLimit is not None:
+            args += ["sec", str(solver.timeLimit)]
+        for option in solver.options + solver.getOptions():
+            args += option.split()
+        args += ["branch", "printingOptions", "all", "solution", sol_path]
+        log_path = solver.optionsDict.get("logPath")
+        with open(log_path or os.devnull, "w") as pipe:
+            returncode = subprocess.call(
+                args, stdout=pipe, stderr=pipe, stdin=subprocess.DEVNULL
+            )
+        if returncode != 0 or not os.path.exists(sol_path):
+            raise PulpSolverError(f"Error while executing {solver.path}")
+        self.status, self.sol_status = solver.get_status(sol_path)
+        self.values = np.zeros(self.numVariables())
+        with open(sol_path) as f:
+            next(f)
+            for line in f:
+                tokens = line.split()
+                if tokens[0] == "**":
+                    tokens = tokens[1:]
+                j = self.columns.get(tokens[1])
+                if j is not None:
+                    self.values[j] = float(tokens[2])
+
+    def _solve_cplex(self, solver, mps_path, sol_path, mst_path, warm_start):
+        commands = [f"read {mps_path}"]
+        if warm_start:
+            root = et.Element("CPLEXSolution", version="1.2")
+            et.SubElement(root, "header")
+            variables = et.SubElement(root, "variables")
+            for j, (name, value) in enumerate(
+                zip(self.column_names, self.initial.tolist())
+            ):
+                et.SubElement(
+                    variables,
+                    "variable",
+                    name=name,
+                    value=str(value),
+                    index=str(j),
+                )
+            et.ElementTree(root).write(
+                mst_path, encoding="utf-8", xml_declaration=True
+            )
+            commands += [f"read {mst_path}", "set advance 1"]
+        if solver.timeLimit is not None:
+            commands.append(f"set timelimit {solver.timeLimit}")
+        commands += solver.options + solver.getOptions()
+        commands += ["mipopt", f"write {sol_path}", "quit", ""]
+        cplex = subprocess.run(
+            solver.path,
+            input="\n".join(commands).encode(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if cplex.returncode != 0:
+            raise PulpSolverError(f"Error while executing {solver.path}")
+        self.values = np.zeros(self.numVariables())
+        if not os.path.exists(sol_path):
+            self.status, self.sol_status = -1, -1
+            return
+        status, values, _, _, _, sol_status = solver.readsol(sol_path)
+        for name, value in values.items():
+            j = self.columns.get(name)
+            if j is not None:
+                self.values[j] = value
+        self.status = status
+        self.sol_status = (
+            sol_status
+            if sol_status is not None
+            else LpStatusToSolution[status]
+        )
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+# Share of the students in each department and in each year.
+DEPARTMENT_SHARES = {
+    "BUS": 0.3,
+    "ECO": 0.2,
+    "IRE": 0.15,
+    "IBS": 0.12,
+    "TMT": 0.1,
+    "BUSS": 0.05,
+    "ECOS": 0.04,
+    "IRES": 0.04,
+}
+YEAR_SHARES = [0.3, 0.25, 0.23, 0.22]
+CORE_COURSES = 4
+ELECTIVES = 2
+OUTSIDE_ELECTIVE = 0.3
+REPEAT = 0.25
+
+
+def synthetic_enrollments(n_students, seed=27):
+    # Students take the core courses of their department and year, a few
+    # electives of their year, sometimes one from another department, and
+    # repeat courses of earlier years. Departments offer more courses as
+    # the faculty grows. Every first year student also takes the common
+    # English course.
+    rng = np.random.RandomState(seed)
+    per_year = CORE_COURSES + ELECTIVES + 2 + n_students // 5000
+    departments = list(DEPARTMENT_SHARES)
+    courses = {
+        (department, year): [
+            f"{department}{year}{number:03d}" for number in range(per_year)
+        ]
+        for department in departments
+        for year in range(1, 5)
+    }
+    student_departments = rng.choice(
+        departments, size=n_students, p=list(DEPARTMENT_SHARES.values())
+    )
+    student_years = rng.choice(range(1, 5), size=n_students, p=YEAR_SHARES)
+    rows = []
+    for student_id, department, year in zip(
+        range(1, n_students + 1), student_departments, student_years
+    ):
+        own = courses[department, year]
+        taken = own[:CORE_COURSES] + list(
+            rng.choice(own[CORE_COURSES:], size=ELECTIVES, replace=False)
+        )
+        if rng.random_sample() < OUTSIDE_ELECTIVE:
+            other = departments[rng.randint(len(departments))]
+            taken.append(
+                courses[other, year][rng.randint(CORE_COURSES, per_year)]
+            )
+        if year > 1 and rng.random_sample() < REPEAT:
+            earlier = courses[department, rng.randint(1, year)]
+            taken.append(earlier[rng.randint(CORE_COURSES)])
+        if year == 1:
+            taken.append("ENG1001")
+        rows.extend((student_id, course) for course in set(taken))
+    return pd.DataFrame(rows, columns=["student_id", "course_code"])
@@ -0,0 +1,278 @@
+import os
+import time
+from functools import partial
+
+from django.core.management.base import CommandError
+from django.db import connections
+from pulp import LpSolutionOptimal
+from pulp import LpStatusInfeasible
+from pulp import LpStatusOptimal
+from pulp import PulpSolverError
+from pulp import value
+
+from ._cache import save_checkpoint
+from ._heuristics import anneal
+from ._heuristics import dsatur
+from ._conflicts import clashing_pairs
+from ._model import add_conflicts
+from ._model import build_model
+from ._model import fix_courses
+from ._model import load_model
+from ._model import read_assignment
+from ._model import set_initial_values
+from ._progress import solve_warm_started
+from ._progress import solver_run
+from ._seating import overfull_slots
+from ._sparse_model import SparseModel
+
+# The shortest solver round when the time limit is split into rounds, in
+# seconds.
+MIN_ROUND = 60
+# A further round of lazy conflicts or seating is only started with at
+# least this many seconds left, in seconds.
+MIN_LAST_ROUND = 10
+
+GRIDS = {
+    "regular": {
+        "days": range(10),
+        "sessions": range(4),
+        "daily_limit": 1,
+        "time_limit": 10000,
+    },
+    "resit": {
+        "days": range(5),
+        "sessions": range(5),
+        "daily_limit": 2,
+        "time_limit": 3600,
+    },
+}
+
+
+def worker_options(options, n, **changes):
+    # The options of one of n problems solved in parallel worker processes,
+    # which share the threads and write nothing to the console or the
+    # cache. The workers record their solver runs over their own
+    # connections, so those of this process are closed.
+    connections.close_all()
+    return dict(
+        options,
+        threads=max(1, (options["threads"] or 1) // n),
+        stdout=None,
+        stderr=None,
+        model_file=None,
+        checkpoint_file=None,
+        **changes
+    )
+
+
+def solve_timetable(
+    name,
+    course_list,
+    conflicts,
+    conflict_groups,
+    student_groups,
+    days,
+    sessions,
+    daily_limit,
+    time_limit,
+    options,
+    fixed=None,
+    initial=None,
+    **capacity
+):
+    if initial is None:
+        initial = dsatur(
+            course_list, conflicts, days, sessions, fixed=fixed, **capacity
+        )
+    # In a portfolio, the best timetables are shared with the other
+    # configurations instead of being saved.
+    incumbent = options.get("incumbent")
+    checkpoint = None
+    if incumbent is not None:
+        checkpoint = incumbent.offer
+    elif options.get("checkpoint_file") and options["checkpoint_interval"]:
+        checkpoint = partial(save_checkpoint, options["checkpoint_file"], name)
+    if options["draft"] or options["engine"] == "annealing":
+        if initial is None:
+            raise CommandError(
+                "No feasible starting timetable could be produced."
+            )
+        if options["draft"]:
+            return initial
+        return anneal(
+            course_list,
+            conflicts,
+            student_groups,
+            days,
+            sessions,
+            daily_limit,
+            initial,
+            options["time_limit"] or 300,
+            seed=options["seed"],
+            fixed=fixed,
+            checkpoint=checkpoint,
+            checkpoint_interval=options["checkpoint_interval"],
+            stop=incumbent and incumbent.stopped,
+            **capacity
+        )
+    # With lazy conflicts or classroom seating the model grows while it is
+    # solved, so it is not cached.
+    lazy = options["conflicts"] == "lazy"
+    seating = options.get("seating")
+    model_file = None if lazy or seating else options.get("model_file")
+    sparse = options["builder"] == "sparse"
+    if sparse:
+        prob = SparseModel(
+            name,
+            course_list,
+            conflict_groups,
+            student_groups,
+            days,
+            sessions,
+            daily_limit,
+            **capacity
+        )
+        if fixed:
+            prob.fix_courses(fixed)
+        if model_file:
+            if not os.path.exists(model_file):
+                prob.write_mps(model_file + ".tmp")
+                os.replace(model_file + ".tmp", model_file)
+            prob.mps_path = model_file
+    elif model_file and os.path.exists(model_file):
+        prob, exam, penalties = load_model(
+            model_file, course_list, len(student_groups), days, sessions
+        )
+    else:
+        prob, exam, penalties = build_model(
+            name,
+            course_list,
+            conflict_groups,
+            student_groups,
+            days,
+            sessions,
+            daily_limit,
+            **capacity
+        )
+        if fixed:
+            fix_courses(exam, fixed, days, sessions)
+        if model_file:
+            prob.writeMPS(model_file + ".tmp")
+            os.replace(model_file + ".tmp", model_file)
+    # The command line solvers cannot report incumbents while they run, so
+    # with checkpoints the time limit is split into rounds. Each round is
+    # warm started from the best timetable so far, which is saved after
+    # every improvement.
+    time_limit = options["time_limit"] or time_limit
+    started = time.monotonic()
+    best = best_objective = None
+    rounds = 0
+    with solver_run("schedule_exams", name, options) as run:
+        while True:
+            if rounds and (
+                time_limit - (time.monotonic() - started) < MIN_LAST_ROUND
+            ):
+                break
+            rounds += 1
+            if incumbent is not None:
+                shared, shared_objective = incumbent.get()
+                if shared is not None and (
+                    best is None or shared_objective < best_objective - 1e-6
+                ):
+                    initial = shared
+            if initial is not None and sparse:
+                prob.set_initial_values(initial, student_groups, daily_limit)
+            elif initial is not None:
+                set_initial_values(
+                    exam,
+                    penalties,
+                    initial,
+                    student_groups,
+                    days,
+                    sessions,
+                    daily_limit,
+                )
+            remaining = time_limit - (time.monotonic() - started)
+            if checkpoint is not None:
+                # Every round starts the solver over, so no round is
+                # shorter than MIN_ROUND and the last one takes the rest.
+                interval = max(options["checkpoint_interval"], MIN_ROUND)
+                if remaining >= interval + MIN_ROUND:
+                    remaining = interval
+            try:
+                status = solve_warm_started(
+                    prob,
+                    dict(options, time_limit=max(1, int(remaining))),
+                    run,
+                    initial is not None,
+                )
+            except PulpSolverError:
+                # A crash in a later round leaves the best timetable of the
+                # earlier ones.
+                if best is None:
+                    raise
+                break
+            if status == LpStatusInfeasible and best is None:
+                raise CommandError("Timetabling problem is infeasible.")
+            if status != LpStatusOptimal:
+                # The round ran out of time or was stopped before it found
+                # a solution, which leaves the best timetable so far.
+                break
+            if sparse:
+                objective = prob.objective_value()
+                assignment = prob.read_assignment()
+            else:
+                objective = value(prob.objective) or 0
+                assignment = read_assignment(exam, days, sessions)
+            # Conflict rows are only added for the pairs that clash in the
+            # solution and the courses that cannot be seated together, and
+            # the model is solved again.
+            clashes = []
+            if lazy:
+                clashes += clashing_pairs(course_list, conflicts, assignment)
+            if seating:
+                clashes += overfull_slots(assignment, *seating)
+            if clashes:
+                if sparse:
+                    prob.add_conflicts(clashes)
+                else:
+                    add_conflicts(prob, exam, clashes, days, sessions)
+                run.constraints = prob.numConstraints()
+            if not clashes and (
+                best is None or objective < best_objective - 1e-6
+            ):
+                best = assignment
+                best_objective = objective
+                if checkpoint is not None:
+                    checkpoint(best, best_objective)
+            if not clashes and (
+                prob.sol_status == LpSolutionOptimal
+                or run.stop_reason == "objective target"
+            ):
+                # The other configurations of a portfolio can stop too.
+                if incumbent is not None:
+                    incumbent.stop()
+                break
+            if not clashes and (
+                checkpoint is None or run.stop_reason == "stall"
+            ):
+                break
+            if incumbent is not None and incumbent.stopped():
+                break
+            initial = best or initial
+        run.objective = best_objective
+    # If no solution without clashes was found in time, the starting
+    # timetable is returned as long as it passes the same checks.
+    if (
+        best is None
+        and initial is not None
+        and not clashing_pairs(course_list, conflicts, initial)
+        and not (seating and overfull_slots(initial, *seating))
+    ):
+        best = initial
+    if best is None:
+        raise CommandError(
+            "No timetable without conflicts that can be seated was found"
+            " within the time limit."
+        )
+    return best
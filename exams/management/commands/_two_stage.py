@@ -0,0 +1,229 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from django.core.management.base import CommandError
+from pulp import lpSum
+from pulp import value
+
+from ._conflicts import clique_cover
+from ._heuristics import dsatur
+from ._model import build_day_model
+from ._model import read_days
+from ._model import set_initial_days
+from ._presolve import restrict_capacity
+from ._progress import solve_warm_started
+from ._progress import solver_run
+from ._timetabling import solve_timetable
+from ._timetabling import worker_options
+
+# Share of the time limit given to the day problem. The session problems
+# are small and mostly solved by DSatur.
+DAY_STAGE_SHARE = 0.9
+
+
+def _solve_day(
+    name,
+    courses,
+    conflicts,
+    conflict_groups,
+    day,
+    sessions,
+    options,
+    fixed,
+    **capacity
+):
+    # Places the courses of one day into its sessions. There is nothing to
+    # minimise within a day, so a DSatur colouring is used if it finds one
+    # and the MIP only has to settle the hard days. Returns None if the
+    # courses do not fit in the day.
+    days = range(day, day + 1)
+    assignment = dsatur(
+        courses, conflicts, days, sessions, fixed=fixed, **capacity
+    )
+    if assignment is not None:
+        return assignment
+    try:
+        return solve_timetable(
+            name,
+            courses,
+            conflicts,
+            conflict_groups,
+            pd.Series(dtype=int),
+            days,
+            sessions,
+            0,
+            options["time_limit"],
+            options,
+            fixed=fixed,
+            initial=None,
+            **capacity
+        )
+    except CommandError:
+        return None
+
+
+def solve_two_stage(
+    name,
+    course_list,
+    conflicts,
+    conflict_groups,
+    student_groups,
+    days,
+    sessions,
+    daily_limit,
+    time_limit,
+    options,
+    fixed=None,
+    initial=None,
+    **capacity
+):
+    # The daily penalties only depend on the day of each course, so the
+    # courses are first assigned to days and then each day's courses are
+    # placed into its sessions, days in parallel. A set of courses that
+    # cannot be placed into the sessions of a day is cut off from the day
+    # problem, which is solved again.
+    if initial is None:
+        initial = dsatur(
+            course_list, conflicts, days, sessions, fixed=fixed, **capacity
+        )
+    time_limit = options["time_limit"] or time_limit
+    started = time.monotonic()
+    prob, course_day, penalties = build_day_model(
+        f"{name} days",
+        course_list,
+        clique_cover(course_list, conflicts),
+        student_groups,
+        days,
+        len(sessions),
+        daily_limit,
+        **capacity
+    )
+    for course, (day, _) in (fixed or {}).items():
+        for other in days:
+            variable = course_day[course][other]
+            variable.lowBound = variable.upBound = int(other == day)
+    workers = options["workers"] or os.cpu_count()
+    placed = {}
+    with solver_run("schedule_exams", f"{name} days", options) as run:
+        while True:
+            if initial is not None:
+                set_initial_days(
+                    course_day,
+                    penalties,
+                    initial,
+                    student_groups,
+                    days,
+                    daily_limit,
+                )
+            remaining = DAY_STAGE_SHARE * time_limit - (
+                time.monotonic() - started
+            )
+            status = solve_warm_started(
+                prob,
+                dict(options, time_limit=max(1, int(remaining))),
+                run,
+                initial is not None,
+            )
+            if status in [0, -1, -2]:
+                raise CommandError("Timetabling problem is infeasible.")
+            by_day = {}
+            for course, day in read_days(course_day, days).items():
+                by_day.setdefault(day, []).append(course)
+            pending = {
+                day: courses
+                for day, courses in by_day.items()
+                if (day, frozenset(courses)) not in placed
+            }
+            results = _solve_days(
+                name,
+                course_list,
+                conflicts,
+                conflict_groups,
+                pending,
+                sessions,
+                time_limit - (time.monotonic() - started),
+                workers,
+                options,
+                fixed or {},
+                capacity,
+            )
+            infeasible = []
+            for day, result in results.items():
+                if result is None:
+                    infeasible.append(pending[day])
+                else:
+                    placed[day, frozenset(pending[day])] = result
+            if not infeasible:
+                break
+            if time.monotonic() - started >= time_limit:
+                raise CommandError(
+                    f"The days of the {name} problem could not be split"
+                    f" into sessions within the time limit."
+                )
+            # Days are interchangeable, so the courses are kept apart on
+            # every day.
+            for courses in infeasible:
+                for day in days:
+                    prob += (
+                        lpSum(course_day[course][day] for course in courses)
+                        <= len(courses) - 1
+                    )
+            initial = None
+        run.objective = value(prob.objective)
+    assignment = {}
+    for day, courses in by_day.items():
+        assignment.update(placed[day, frozenset(courses)])
+    return assignment
+
+
+def _solve_days(
+    name,
+    course_list,
+    conflicts,
+    conflict_groups,
+    by_day,
+    sessions,
+    time_limit,
+    workers,
+    options,
+    fixed,
+    capacity,
+):
+    if not by_day:
+        return {}
+    sub_options = worker_options(
+        options, len(by_day), time_limit=max(1, int(time_limit))
+    )
+    futures = {}
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(by_day))
+    ) as executor:
+        for day, courses in by_day.items():
+            idx = course_list.get_indexer(courses)
+            members = set(courses)
+            futures[day] = executor.submit(
+                _solve_day,
+                f"{name} day {day}",
+                course_list[idx],
+                conflicts[idx][:, idx],
+                [
+                    group
+                    for group in (
+                        tuple(c for c in group if c in members)
+                        for group in conflict_groups
+                    )
+                    if len(group) > 1
+                ],
+                day,
+                sessions,
+                sub_options,
+                {
+                    course: slot
+                    for course, slot in fixed.items()
+                    if course in members
+                },
+                **restrict_capacity(capacity, courses)
+            )
+        return {day: future.result() for day, future in futures.items()}
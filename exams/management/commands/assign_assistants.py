@@ -1,7 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.core.management.base import CommandError
 from django.db.models import Count
-from pulp import CPLEX
 from pulp import LpInteger
 from pulp import LpMinimize
 from pulp import LpProblem
@@ -17,18 +16,50 @@ from exams.models import AssistantAssignment
 from exams.models import Assistant
 from exams.models import AssistedCourse
 
+from ._bundle import check_bundle
+from ._bundle import input_hash
+from ._bundle import read_bundle
+from ._bundle import read_solution
+from ._bundle import write_bundle
+from ._progress import solve_with_progress
+from ._progress import solver_run
+from ._solvers import add_solver_arguments
+from ._solvers import get_solver
+
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("--period", required=True)
+        parser.add_argument("--export", dest="export_dir")
+        parser.add_argument("--import", dest="import_dir")
+        add_solver_arguments(parser)
 
     def handle(self, *args, **options):
+        if options["export_dir"] and options["import_dir"]:
+            raise CommandError("--export cannot be combined with --import.")
         academic_year = AcademicYear.objects.get(active=True)
         period = Period.objects.get(
             academic_year=academic_year, period=options["period"]
         )
         assistants = Assistant.objects.exclude(user__is_active=False)
         sittings = Sitting.objects.filter(exam__period=period)
+        digest = self._input_hash(period, assistants, sittings)
+        if options["import_dir"]:
+            bundle = read_bundle(options["import_dir"], "assign_assistants")
+            check_bundle(bundle, digest)
+            chosen = read_solution(options["import_dir"], bundle)
+            self._save_assignments(
+                period,
+                [
+                    AssistantAssignment(
+                        assistant_id=assistant_id,
+                        sitting_id=sitting_id,
+                        active=True,
+                    )
+                    for assistant_id, sitting_id in chosen["assistants"]
+                ],
+            )
+            return
         times = Timetable.objects.filter(exam__period=period)
         times = (
             times.values_list("session__long_code", flat=True)
@@ -147,12 +178,41 @@ class Command(BaseCommand):
                 )
                 == 2 - department_penalty[sitting]
             )
-        status = prob.solve(CPLEX())
-        if status in [0, -1, -2]:
-            raise CommandError("Assistant problem is infeasible.")
-        AssistantAssignment.objects.filter(
-            sitting__exam__period=period
-        ).delete()
+        if options["export_dir"]:
+            write_bundle(
+                options["export_dir"],
+                "assign_assistants",
+                digest,
+                [
+                    {
+                        "name": "assistants",
+                        "prob": prob,
+                        "variables": {
+                            ast_assignment[assistant][sitting].name: [
+                                assistant.pk,
+                                sitting.pk,
+                            ]
+                            for assistant in assistants
+                            for sitting in sittings
+                        },
+                    }
+                ],
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"The assistant problem has been exported to"
+                    f" {options['export_dir']}. Solve the bundle with"
+                    f" solve_bundle.py and write it back with --import."
+                )
+            )
+            return
+        with solver_run("assign_assistants", f"{period}", options) as run:
+            status = solve_with_progress(
+                prob, get_solver(options), run, options
+            )
+            if status in [0, -1, -2]:
+                raise CommandError("Assistant problem is infeasible.")
+            run.objective = value(prob.objective)
         objs = []
         for assistant in assistants:
             for sitting in sittings:
@@ -161,5 +221,37 @@ class Command(BaseCommand):
                         assistant=assistant, sitting=sitting, active=True
                     )
                     objs.append(obj)
+        self._save_assignments(period, objs)
+
+    def _input_hash(self, period, assistants, sittings):
+        # The sittings with their times and numbers of students, the
+        # assistants and the courses they assist.
+        return input_hash(
+            period.pk,
+            list(
+                sittings.annotate(students=Count("layout"))
+                .order_by("pk")
+                .values_list(
+                    "pk",
+                    "exam__offering",
+                    "exam__offering__department",
+                    "exam__timetable__session__long_code",
+                    "students",
+                )
+            ),
+            list(assistants.order_by("pk").values_list("pk", "department")),
+            list(
+                AssistedCourse.objects.filter(
+                    offering__academic_year=period.academic_year
+                )
+                .order_by("pk")
+                .values_list("assistant", "offering")
+            ),
+        )
+
+    def _save_assignments(self, period, objs):
+        AssistantAssignment.objects.filter(
+            sitting__exam__period=period
+        ).delete()
         AssistantAssignment.objects.bulk_create(objs)
         self.stdout.write(self.style.SUCCESS("Done."))
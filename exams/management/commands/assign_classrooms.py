@@ -2,8 +2,8 @@ import random
 
 from django.core.management.base import BaseCommand
 from django.core.management.base import CommandError
+from django.db.models import Count
 from django.db.models import Sum
-from pulp import CPLEX
 from pulp import LpInteger
 from pulp import LpMinimize
 from pulp import LpProblem
@@ -20,22 +20,58 @@ from exams.models import Sitting
 from exams.models import TimeCode
 from exams.models import Timetable
 
+from ._bundle import check_bundle
+from ._bundle import input_hash
+from ._bundle import read_bundle
+from ._bundle import read_solution
+from ._bundle import write_bundle
+from ._progress import solve_with_progress
+from ._progress import solver_run
+from ._solvers import add_solver_arguments
+from ._solvers import get_solver
+
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("--period", required=True)
+        parser.add_argument("--blocks", nargs="+")
+        parser.add_argument("--export", dest="export_dir")
+        parser.add_argument("--import", dest="import_dir")
+        add_solver_arguments(parser)
 
     def handle(self, *args, **options):
+        if options["export_dir"] and options["import_dir"]:
+            raise CommandError("--export cannot be combined with --import.")
         academic_year = AcademicYear.objects.get(active=True)
         period = Period.objects.get(
             academic_year=academic_year, period=options["period"]
         )
-        times = TimeCode.objects.filter(period=period)
+        # schedule_exams creates the time codes of the whole grid, some of
+        # which may have no exams.
+        times = TimeCode.objects.filter(
+            period=period, timetable__isnull=False
+        ).distinct()
         probs = {}
         for time in times:
             probs[time] = LpProblem(f"Problem {time}", LpMinimize)
         all_exams = Timetable.objects.filter(exam__period=period)
         classrooms = Classroom.objects.all()
+        if options["blocks"]:
+            classrooms = classrooms.filter(block__in=options["blocks"])
+        digest = self._input_hash(period, all_exams, classrooms)
+        if options["import_dir"]:
+            bundle = read_bundle(options["import_dir"], "assign_classrooms")
+            check_bundle(bundle, digest)
+            chosen = read_solution(options["import_dir"], bundle)
+            self._save_sittings(
+                period,
+                [
+                    Sitting(exam_id=exam_id, classroom_id=classroom_id)
+                    for pairs in chosen.values()
+                    for classroom_id, exam_id in pairs
+                ],
+            )
+            return
         class_vars = LpVariable.dicts(
             name="classroom_assignment",
             indexs=(classrooms, all_exams),
@@ -64,10 +100,18 @@ class Command(BaseCommand):
                     >= exam.exam.enrollment_set.count()
                 )
             prob += classrooms_used
-            status = prob.solve(CPLEX())
-            if status in [0, -1, -2]:
-                raise CommandError("Classroom problem is infeasible.")
-        Sitting.objects.filter(exam__period=period).delete()
+            if options["export_dir"]:
+                continue
+            with solver_run("assign_classrooms", f"{time}", options) as run:
+                status = solve_with_progress(
+                    prob, get_solver(options), run, options
+                )
+                if status in [0, -1, -2]:
+                    raise CommandError("Classroom problem is infeasible.")
+                run.objective = value(prob.objective)
+        if options["export_dir"]:
+            self._export(options["export_dir"], probs, class_vars, digest)
+            return
         objs = []
         for ex in all_exams:
             for classroom in classrooms:
@@ -76,7 +120,50 @@ class Command(BaseCommand):
                     if abs(result - 1) < 0.01:
                         obj = Sitting(exam=ex.exam, classroom=classroom)
                         objs.append(obj)
+        self._save_sittings(period, objs)
+
+    def _input_hash(self, period, all_exams, classrooms):
+        # The timetable with the number of students of each exam, and the
+        # classrooms.
+        return input_hash(
+            period.pk,
+            list(
+                all_exams.annotate(students=Count("exam__enrollment"))
+                .order_by("pk")
+                .values_list("pk", "exam", "session", "students")
+            ),
+            list(classrooms.order_by("pk").values_list("pk", "capacity")),
+        )
 
+    def _export(self, path, probs, class_vars, digest):
+        # One model per time slot, with the variables of its exams.
+        keys = {
+            variable.name: [classroom.pk, exam.exam_id]
+            for classroom, variables in class_vars.items()
+            for exam, variable in variables.items()
+        }
+        models = [
+            {
+                "name": f"slot_{time.short_code}",
+                "prob": prob,
+                "variables": {
+                    variable.name: keys[variable.name]
+                    for variable in prob.variables()
+                },
+            }
+            for time, prob in probs.items()
+        ]
+        write_bundle(path, "assign_classrooms", digest, models)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"The classroom problems have been exported to {path}. Solve"
+                f" the bundle with solve_bundle.py and write it back with"
+                f" --import."
+            )
+        )
+
+    def _save_sittings(self, period, objs):
+        Sitting.objects.filter(exam__period=period).delete()
         Sitting.objects.bulk_create(objs)
         self.stdout.write(
             self.style.SUCCESS(
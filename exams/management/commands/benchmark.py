@@ -0,0 +1,258 @@
+import json
+import os
+import platform
+import time
+import tracemalloc
+from itertools import product
+
+import pulp
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.utils import timezone
+from pulp import PulpSolverError
+from pulp import value
+
+from ._conflicts import build_conflict_matrix
+from ._conflicts import formulate_conflicts
+from ._heuristics import anneal
+from ._heuristics import dsatur
+from ._heuristics import timetable_cost
+from ._model import build_model
+from ._model import read_assignment
+from ._model import set_initial_values
+from ._presolve import course_capacity
+from ._presolve import group_students
+from ._progress import solve_with_progress
+from ._progress import solver_run
+from ._solvers import add_solver_arguments
+from ._solvers import get_solver
+from ._sparse_model import SparseModel
+from ._synthetic import synthetic_enrollments
+from ._timetabling import GRIDS
+
+ENGINES = ["draft", "annealing", "mip"]
+FORMULATIONS = ["clique", "pairwise"]
+BUILDERS = ["pulp", "sparse"]
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--students", type=int, nargs="+", default=[1000, 5000, 10000]
+        )
+        parser.add_argument(
+            "--engines", nargs="+", choices=ENGINES, default=ENGINES
+        )
+        parser.add_argument(
+            "--conflicts",
+            nargs="+",
+            choices=FORMULATIONS,
+            default=FORMULATIONS,
+        )
+        parser.add_argument(
+            "--builders", nargs="+", choices=BUILDERS, default=BUILDERS
+        )
+        parser.add_argument(
+            "--problems", nargs="+", choices=list(GRIDS), default=["regular"]
+        )
+        parser.add_argument("--seed", type=int, default=27)
+        parser.add_argument("--output")
+        add_solver_arguments(parser)
+
+    def handle(self, *args, **options):
+        if "sparse" in options["builders"] and options["solver"] == "highs":
+            raise CommandError("--builders sparse is not supported by highs.")
+        # The MIP solves are not recorded as solver runs; the first
+        # incumbent time is read from the progress kept in memory.
+        options = dict(options, record=False)
+        time_limit = options["time_limit"] or 60
+        results = []
+        for n_students in options["students"]:
+            df = synthetic_enrollments(n_students, seed=options["seed"])
+            for problem in options["problems"]:
+                for engine in options["engines"]:
+                    variants = [(None, None)]
+                    if engine == "mip":
+                        variants = product(
+                            options["conflicts"], options["builders"]
+                        )
+                    for formulation, builder in variants:
+                        result = self._run(
+                            df,
+                            problem,
+                            engine,
+                            formulation,
+                            builder,
+                            time_limit,
+                            options,
+                        )
+                        result.update(
+                            students=n_students,
+                            enrollments=len(df),
+                            courses=int(df["course_code"].nunique()),
+                        )
+                        results.append(result)
+                        variant = f" ({formulation}, {builder})"
+                        self.stdout.write(
+                            f"{n_students} students, {problem}, {engine}"
+                            f"{variant if builder else ''}:"
+                            f" {result['status']}, objective"
+                            f" {result['objective']},"
+                            f" {result['total_seconds']:.1f} seconds"
+                        )
+        output = options["output"] or (
+            f"benchmark-{timezone.now():%Y%m%d-%H%M%S}.json"
+        )
+        with open(output, "w") as f:
+            json.dump(
+                {
+                    "created": timezone.now().isoformat(),
+                    "machine": {
+                        "cpus": os.cpu_count(),
+                        "python": platform.python_version(),
+                        "pulp": pulp.__version__,
+                    },
+                    "solver": options["solver"],
+                    "threads": options["threads"],
+                    "time_limit": time_limit,
+                    "seed": options["seed"],
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Benchmark results written to {output}.")
+        )
+
+    def _prepare(self, df, problem, engine, formulation, builder):
+        grid = GRIDS[problem]
+        capacity = course_capacity(df) if problem == "regular" else {}
+        course_list = df.groupby("course_code").size().index
+        conflicts = build_conflict_matrix(df, course_list)
+        student_groups = group_students(df, grid["daily_limit"] + 1)
+        model = None
+        if engine == "mip":
+            conflict_groups = formulate_conflicts(
+                course_list, conflicts, formulation
+            )
+            build = SparseModel if builder == "sparse" else build_model
+            model = build(
+                f"{problem}_benchmark",
+                course_list,
+                conflict_groups,
+                student_groups,
+                grid["days"],
+                grid["sessions"],
+                grid["daily_limit"],
+                **capacity,
+            )
+        return course_list, conflicts, student_groups, capacity, model
+
+    def _run(
+        self, df, problem, engine, formulation, builder, time_limit, options
+    ):
+        grid = GRIDS[problem]
+        days, sessions = grid["days"], grid["sessions"]
+        result = {
+            "problem": problem,
+            "engine": engine,
+            "conflicts": formulation,
+            "builder": builder,
+            "variables": None,
+            "constraints": None,
+            "first_incumbent_seconds": None,
+            "objective": None,
+        }
+        # Memory is measured in a separate pass, as tracing slows down the
+        # build and would distort its time.
+        tracemalloc.start()
+        self._prepare(df, problem, engine, formulation, builder)
+        result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        prepared = self._prepare(df, problem, engine, formulation, builder)
+        course_list, conflicts, student_groups, capacity, model = prepared
+        result["build_seconds"] = time.perf_counter() - started
+        initial = dsatur(course_list, conflicts, days, sessions, **capacity)
+        result["first_feasible_seconds"] = time.perf_counter() - started
+        assignment = None
+        if initial is None:
+            result["status"] = "No feasible start"
+        elif engine == "draft":
+            assignment = initial
+            result["status"] = "Feasible"
+        elif engine == "annealing":
+            assignment = anneal(
+                course_list,
+                conflicts,
+                student_groups,
+                days,
+                sessions,
+                grid["daily_limit"],
+                initial,
+                time_limit,
+                seed=options["seed"],
+                **capacity,
+            )
+            result["status"] = "Feasible"
+        else:
+            if builder == "sparse":
+                prob = model
+                prob.set_initial_values(
+                    initial, student_groups, grid["daily_limit"]
+                )
+            else:
+                prob, exam, penalties = model
+                set_initial_values(
+                    exam,
+                    penalties,
+                    initial,
+                    student_groups,
+                    days,
+                    sessions,
+                    grid["daily_limit"],
+                )
+            result["variables"] = prob.numVariables()
+            result["constraints"] = prob.numConstraints()
+            # A solver crash is a result too, so it is recorded and the
+            # benchmark goes on.
+            status = None
+            try:
+                with solver_run(
+                    "benchmark",
+                    f"{df['student_id'].nunique()} students {problem}",
+                    options,
+                ) as run:
+                    status = solve_with_progress(
+                        prob,
+                        get_solver(options, time_limit, warm_start=True),
+                        run,
+                        options,
+                    )
+                    if builder == "sparse":
+                        run.objective = prob.objective_value()
+                    else:
+                        run.objective = value(prob.objective)
+            except PulpSolverError:
+                pass
+            result["status"] = run.status
+            incumbents = [
+                line.elapsed
+                for line in run.progress_lines
+                if line.incumbent is not None
+            ]
+            if incumbents:
+                result["first_incumbent_seconds"] = incumbents[0]
+            if status not in [None, 0, -1, -2]:
+                if builder == "sparse":
+                    assignment = prob.read_assignment()
+                else:
+                    assignment = read_assignment(exam, days, sessions)
+        result["total_seconds"] = time.perf_counter() - started
+        if assignment is not None:
+            result["objective"] = timetable_cost(
+                assignment, student_groups, days, sessions, grid["daily_limit"]
+            )
+        return result
@@ -2,10 +2,13 @@ from django.core.management.base import BaseCommand
 from django.core.management.base import CommandError
 
 from exams.models import AcademicYear
+from exams.models import Period
+from exams.signals import bulk_enrollment_changes
 
 from ._constants import COL_DICT
 from ._constants import DEPT_DICT
 from ._constants import REQUIRED_COLS
+from ._helpers import add_course_conflicts_to_db
 from ._helpers import add_courses_to_db
 from ._helpers import add_departments_to_db
 from ._helpers import add_offerings_to_db
@@ -51,12 +54,18 @@ class Command(BaseCommand):
                     f" problem in the Excel file."
                 )
             )
-        add_departments_to_db()
-        add_periods_to_db(academic_year)
-        add_instructors_to_db(df["course_instructor"])
-        add_courses_to_db(df)
-        add_offerings_to_db(df, academic_year)
-        add_students_to_db(df)
-        add_exams_to_db(df, academic_year)
-        add_enrollments_to_db(df, academic_year)
+        # Deleting the offerings and exams of the year deletes their
+        # enrollments too, so the signals are paused for the whole load.
+        with bulk_enrollment_changes():
+            add_departments_to_db()
+            add_periods_to_db(academic_year)
+            add_instructors_to_db(df["course_instructor"])
+            add_courses_to_db(df)
+            add_offerings_to_db(df, academic_year)
+            add_students_to_db(df)
+            add_exams_to_db(df, academic_year)
+            add_enrollments_to_db(df, academic_year)
+            add_course_conflicts_to_db(
+                Period.objects.filter(academic_year=academic_year)
+            )
         self.stdout.write(self.style.SUCCESS(f"Data loaded."))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from exams.models import AcademicYear
+from exams.models import Period
+from exams.signals import bulk_enrollment_changes
+
+from ._constants import COL_DICT
+from ._constants import DEPT_DICT
+from ._constants import RESIT_REQUIRED_COLS
+from ._helpers import add_course_conflicts_to_db
+from ._helpers import prune_resit_enrollments_in_db
+from ._helpers import read_excel_file
+from ._helpers import resit_roster
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument("--filepath", required=True)
+
+    def handle(self, *args, **options):
+        academic_year = AcademicYear.objects.get(active=True)
+        df = read_excel_file(options["filepath"])
+        df = df.rename(columns=COL_DICT)
+        for col in RESIT_REQUIRED_COLS:
+            if col not in df:
+                raise CommandError(
+                    f"One of the columns in the Excel file is missing or has a"
+                    f" spelling error: {col}."
+                )
+        df["course_dept"] = df["course_dept"].str.strip().map(DEPT_DICT)
+        df["course_section"] = (
+            df["course_section"]
+            .astype(str)
+            .str.replace(".Şube", "")
+            .astype("int")
+        )
+        df = df[RESIT_REQUIRED_COLS].dropna(
+            subset=["std_id", "course_code", "course_dept"]
+        )
+        roster = resit_roster(df)
+        with transaction.atomic(), bulk_enrollment_changes():
+            kept, removed = prune_resit_enrollments_in_db(
+                roster, academic_year
+            )
+            add_course_conflicts_to_db(
+                Period.objects.filter(
+                    academic_year=academic_year, period="resit"
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Resit roster loaded: {kept} enrollments kept, {removed}"
+                f" removed."
+            )
+        )
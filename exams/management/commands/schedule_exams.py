@@ -1,46 +1,254 @@
-from itertools import combinations
+import json
+import multiprocessing
+import os
+import time
+from contextlib import nullcontext
 from itertools import product
 
 import pandas as pd
 from django.core.management.base import BaseCommand
 from django.core.management.base import CommandError
-from pulp import CPLEX
-from pulp import LpInteger
-from pulp import LpMinimize
-from pulp import LpProblem
-from pulp import LpVariable
-from pulp import lpSum
-from pulp import value
+from django.db import connections
+from django.db import transaction
+from django.db.models import Count
 
 from exams.models import AcademicYear
+from exams.models import Classroom
+from exams.models import CourseConflict
 from exams.models import Enrollment
 from exams.models import Exam
 from exams.models import NoExam
 from exams.models import Period
 from exams.models import TimeCode
 from exams.models import Timetable
+from exams.models import TimetableSnapshot
+
+from ._bundle import check_bundle
+from ._bundle import input_hash
+from ._bundle import read_bundle
+from ._bundle import read_solution
+from ._bundle import write_bundle
+from ._cache import CHECKPOINT_FILE
+from ._cache import MODEL_FILE
+from ._cache import entry_path
+from ._cache import input_key
+from ._cache import load_checkpoint
+from ._cache import load_solution
+from ._cache import save_checkpoint
+from ._cache import save_solution
+from ._conflicts import conflict_neighbourhood
+from ._conflicts import formulate_conflicts
+from ._conflicts import stored_conflict_matrix
+from ._decompose import solve_decomposed
+from ._heuristics import dsatur
+from ._heuristics import timetable_cost
+from ._model import HARD_PENALTY
+from ._model import SOFT_PENALTY
+from ._model import build_model
+from ._model import fix_courses
+from ._portfolio import solve_portfolio
+from ._presolve import changed_courses
+from ._presolve import check_feasibility
+from ._presolve import course_capacity
+from ._presolve import group_students
+from ._presolve import reduce_problem
+from ._presolve import removable_courses
+from ._seating import fits_classrooms
+from ._seating import overfull_slots
+from ._solvers import add_solver_arguments
+from ._sparse_model import SparseModel
+from ._sparse_model import variable_name
+from ._two_stage import solve_two_stage
+from ._timetabling import GRIDS
+from ._timetabling import solve_timetable
+
+# Options that change the timetable computed from the same inputs.
+CACHED_OPTIONS = [
+    "conflicts",
+    "draft",
+    "engine",
+    "seed",
+    "decompose",
+    "two_stage",
+    "portfolio",
+    "presolve",
+    "workers",
+    "solver",
+    "time_limit",
+    "mip_gap",
+    "stall_time",
+    "objective_target",
+    "checkpoint_interval",
+]
 
 
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--conflicts",
+            choices=["clique", "pairwise", "lazy"],
+            default="clique",
+        )
+        parser.add_argument("--draft", action="store_true")
+        parser.add_argument(
+            "--engine", choices=["mip", "annealing"], default="mip"
+        )
+        parser.add_argument("--seed", type=int, default=27)
+        parser.add_argument("--decompose", action="store_true")
+        parser.add_argument("--two-stage", action="store_true")
+        parser.add_argument("--portfolio", action="store_true")
+        parser.add_argument("--presolve", action="store_true")
+        parser.add_argument("--workers", type=int)
+        parser.add_argument("--incremental", action="store_true")
+        parser.add_argument(
+            "--problems",
+            nargs="+",
+            choices=list(GRIDS),
+            default=list(GRIDS),
+        )
+        parser.add_argument("--sequential", action="store_true")
+        parser.add_argument("--check-only", action="store_true")
+        parser.add_argument("--no-cache", action="store_true")
+        parser.add_argument(
+            "--resume",
+            nargs="?",
+            choices=["warm-start", "write"],
+            const="warm-start",
+        )
+        parser.add_argument("--checkpoint-interval", type=int, default=0)
+        parser.add_argument(
+            "--builder", choices=["pulp", "sparse"], default="pulp"
+        )
+        parser.add_argument("--classrooms", action="store_true")
+        parser.add_argument("--blocks", nargs="+")
+        parser.add_argument("--export", dest="export_dir")
+        parser.add_argument("--import", dest="import_dir")
+        add_solver_arguments(parser)
+
     def handle(self, *args, **options):
         academic_year = AcademicYear.objects.get(active=True)
         mt_pr = Period.objects.get(
             academic_year=academic_year, period="midterm"
         )
         fn_pr = Period.objects.get(academic_year=academic_year, period="final")
+        rs_pr = Period.objects.get(academic_year=academic_year, period="resit")
         no_mt = NoExam.objects.filter(period=mt_pr).values_list(
             "course__id", flat=True
         )
         no_fn = NoExam.objects.filter(period=fn_pr).values_list(
             "course__id", flat=True
         )
-        courses_with_no_exam = no_mt.intersection(no_fn)
-        queryset = Enrollment.objects.filter(exam__period=mt_pr).exclude(
+        no_rs = NoExam.objects.filter(period=rs_pr).values_list(
+            "course__id", flat=True
+        )
+        # The resit problem is built from the resit enrollments, which are
+        # narrowed down to the resit roster by load_resit_roster.
+        sources = {
+            "regular": (mt_pr, no_mt.intersection(no_fn)),
+            "resit": (rs_pr, no_rs),
+        }
+        if options["incremental"] and options["decompose"]:
+            raise CommandError(
+                "--incremental cannot be combined with --decompose."
+            )
+        if options["resume"] and options["decompose"]:
+            raise CommandError("--resume cannot be combined with --decompose.")
+        if options["two_stage"] and (
+            options["decompose"]
+            or options["draft"]
+            or options["engine"] != "mip"
+        ):
+            raise CommandError(
+                "--two-stage cannot be combined with --decompose, --draft or"
+                " --engine annealing."
+            )
+        if options["portfolio"] and (
+            options["decompose"]
+            or options["two_stage"]
+            or options["draft"]
+            or options["engine"] != "mip"
+        ):
+            raise CommandError(
+                "--portfolio cannot be combined with --decompose,"
+                " --two-stage, --draft or --engine annealing."
+            )
+        if options["classrooms"] and (
+            options["decompose"]
+            or options["two_stage"]
+            or options["draft"]
+            or options["engine"] != "mip"
+        ):
+            raise CommandError(
+                "--classrooms cannot be combined with --decompose,"
+                " --two-stage, --draft or --engine annealing."
+            )
+        if options["blocks"] and not options["classrooms"]:
+            raise CommandError("--blocks can only be used with --classrooms.")
+        if options["builder"] == "sparse" and options["solver"] == "highs":
+            raise CommandError("--builder sparse is not supported by highs.")
+        if options["export_dir"] and options["import_dir"]:
+            raise CommandError("--export cannot be combined with --import.")
+        if options["export_dir"] and (
+            options["conflicts"] == "lazy"
+            or options["decompose"]
+            or options["two_stage"]
+            or options["portfolio"]
+            or options["presolve"]
+            or options["classrooms"]
+            or options["draft"]
+            or options["engine"] != "mip"
+            or options["resume"]
+        ):
+            raise CommandError(
+                "--export writes a single MIP model and cannot be combined"
+                " with --conflicts lazy, --decompose, --two-stage,"
+                " --portfolio, --presolve, --classrooms, --draft, --engine"
+                " annealing or --resume."
+            )
+        problems = options["problems"]
+        bundle = None
+        if options["import_dir"]:
+            # The problems and the --incremental option of the export.
+            bundle = read_bundle(options["import_dir"], "schedule_exams")
+            problems = [model["name"] for model in bundle["models"]]
+            options = dict(options, incremental=bundle["incremental"])
+        inputs = {
+            problem: self._inputs(problem, *sources[problem], options)
+            for problem in problems
+        }
+        if options["check_only"]:
+            for problem in problems:
+                self._check(problem, inputs[problem], verbose=True)
+            self.stdout.write(
+                self.style.SUCCESS("All feasibility checks have passed.")
+            )
+            return
+        if options["export_dir"]:
+            self._export(problems, inputs, options)
+            return
+        if bundle is not None:
+            self._import(problems, inputs, bundle, options)
+            return
+        if len(problems) > 1 and not options["sequential"]:
+            failed = self._schedule_concurrently(problems, inputs, options)
+            if failed:
+                raise CommandError(
+                    f"Scheduling failed for: {', '.join(failed)}. Re-run"
+                    f" only these with --problems {' '.join(failed)}."
+                )
+        else:
+            for problem in problems:
+                self._schedule(problem, inputs[problem], options)
+
+    def _inputs(self, problem, period, courses_with_no_exam, options):
+        queryset = Enrollment.objects.filter(exam__period=period).exclude(
             exam__offering__course__id__in=courses_with_no_exam
         )
         data = queryset.values(
             "student__tckn", "exam__offering__course__code"
         ).order_by("exam__offering__course__code")
+        if not data.exists():
+            raise CommandError(f"There are no enrollments for {period}.")
 
         df = pd.DataFrame.from_records(data).rename(
             columns={
@@ -48,219 +256,635 @@ class Command(BaseCommand):
                 "exam__offering__course__code": "course_code",
             }
         )
-        course_sizes = df.groupby("course_code").size()
-        max_size = course_sizes.max()
-        large_courses = course_sizes[lambda ser: ser > 400].index
-        small_courses = course_sizes[lambda ser: ser <= 400].index
-        course_list = course_sizes.index
-        students = df["student_id"].unique()
-        self._solve_regular(
-            df,
+        capacity = course_capacity(df)
+        course_list = capacity["course_sizes"].index
+        seating = None
+        if options["classrooms"]:
+            # The seats of a slot are those of the classrooms, and the exams
+            # of a course's sections are seated separately.
+            classrooms = Classroom.objects.filter(capacity__gt=0)
+            if options["blocks"]:
+                classrooms = classrooms.filter(block__in=options["blocks"])
+            rooms = sorted(classrooms.values_list("capacity", flat=True))
+            if not rooms:
+                raise CommandError("There are no classrooms with capacity.")
+            sections = {}
+            for row in (
+                queryset.values("exam", "exam__offering__course__code")
+                .annotate(size=Count("id"))
+                .order_by()
+            ):
+                sections.setdefault(
+                    row["exam__offering__course__code"], []
+                ).append(row["size"])
+            seating = (sections, rooms)
+            capacity = dict(
+                capacity,
+                max_size=sum(rooms),
+                large_courses=course_list[:0],
+                small_courses=course_list[:0],
+            )
+        elif problem != "regular":
+            capacity = {}
+        conflicts = stored_conflict_matrix(
             course_list,
-            students,
-            max_size,
-            course_sizes,
-            large_courses,
-            small_courses,
+            CourseConflict.objects.filter(period=period).values_list(
+                "course_a__code", "course_b__code", "shared_students"
+            ),
         )
-        self._solve_resit(df, course_list, students)
+        return {
+            "df": df,
+            "course_list": course_list,
+            "conflicts": conflicts,
+            "conflict_groups": formulate_conflicts(
+                course_list, conflicts, options["conflicts"]
+            ),
+            "capacity": capacity,
+            "seating": seating,
+            "period": period,
+            "no_exam": list(courses_with_no_exam),
+        }
 
-    def _solve_regular(
-        self,
-        df,
-        course_list,
-        students,
-        max_size,
-        course_sizes,
-        large_courses,
-        small_courses,
-    ):
-        prob = LpProblem("regular exam assignment", LpMinimize)
-        days = range(10)
-        sessions = range(4)
+    def _schedule_concurrently(self, problems, inputs, options):
+        # Each problem runs in a forked process with its share of the
+        # threads. Connections are closed first so that every process opens
+        # its own.
+        context = multiprocessing.get_context("fork")
+        options = dict(
+            options, threads=max(1, (options["threads"] or 1) // len(problems))
+        )
+        # Only the solves overlap; the timetables are written one at a time.
+        write_lock = context.Lock()
+        connections.close_all()
+        processes = {
+            problem: context.Process(
+                target=self._schedule,
+                args=(problem, inputs[problem], options, write_lock),
+            )
+            for problem in problems
+        }
+        for process in processes.values():
+            process.start()
+        for process in processes.values():
+            process.join()
+        return [
+            problem
+            for problem, process in processes.items()
+            if process.exitcode != 0
+        ]
 
-        exam = LpVariable.dicts(
-            "course assignment", (course_list, days, sessions), 0, 1, LpInteger
-        )
-        daily_soft_penalty = LpVariable.dicts(
-            "daily soft penalty", (students, days), 0, 1, LpInteger
-        )
-        daily_hard_penalty = LpVariable.dicts(
-            "daily hard penalty", (students, days), 0, 1, LpInteger
-        )
-        conf_two = {}
-        for student_id, grouped_df in df.groupby("student_id"):
-            courses = grouped_df["course_code"]
-            for c1, c2 in combinations(courses, 2):
-                exists = conf_two.get((c1, c2))
-                if not exists:
-                    conf_two[c1, c2] = 1
-                    for day, session in product(days, sessions):
-                        prob += (
-                            exam[c1][day][session] + exam[c2][day][session]
-                        ) <= 1
-            for day in days:
-                prob += (
-                    (
-                        lpSum(
-                            exam[course][day][session]
-                            for session in sessions
-                            for course in courses
+    def _schedule(self, problem, inputs, options, write_lock=None):
+        grid = GRIDS[problem]
+        started = time.monotonic()
+        fixed = self._fixed(problem, inputs, options)
+        formulation = {name: options[name] for name in CACHED_OPTIONS}
+        formulation["fixed"] = sorted((fixed or {}).items())
+        if inputs["seating"]:
+            formulation["rooms"] = inputs["seating"][1]
+        penalties = {"soft": SOFT_PENALTY, "hard": HARD_PENALTY}
+        key = input_key(
+            problem,
+            inputs["df"],
+            inputs["no_exam"],
+            grid,
+            penalties,
+            formulation,
+        )
+        # Any timetable of the same model is a valid starting point, so the
+        # checkpoints do not depend on the engine or solver options. The
+        # entry is only created and marked as used by runs that save or
+        # read a checkpoint.
+        model_key = self._model_key(problem, inputs, fixed)
+        if options["checkpoint_interval"] or options["resume"]:
+            checkpoint_file = entry_path(model_key, CHECKPOINT_FILE)
+        else:
+            checkpoint_file = os.path.join(
+                entry_path(model_key), CHECKPOINT_FILE
+            )
+        options = dict(
+            options,
+            checkpoint_file=checkpoint_file,
+            seating=inputs["seating"],
+        )
+        assignment = initial = None
+        if options["resume"]:
+            checkpoint = load_checkpoint(checkpoint_file)
+            if checkpoint is None:
+                raise CommandError(
+                    f"There is no checkpoint for the {problem} problem."
+                )
+            initial, objective = checkpoint
+            missing = inputs["course_list"].difference(list(initial))
+            if len(missing):
+                raise CommandError(
+                    f"The checkpoint of the {problem} problem does not cover"
+                    f" {len(missing)} of its courses, for example"
+                    f" {missing[0]}."
+                )
+            self.stdout.write(
+                f"Resuming the {problem} problem from a checkpoint with"
+                f" objective {objective:g}."
+            )
+            if options["resume"] == "write":
+                assignment = initial
+        elif not options["no_cache"]:
+            assignment = load_solution(key)
+            if assignment is not None:
+                self.stdout.write(
+                    f"Using the cached solution of the {problem} problem."
+                )
+        if not options["no_cache"]:
+            options = dict(options, model_file=entry_path(key, MODEL_FILE))
+        if assignment is None:
+            self._check(problem, inputs)
+            if options["decompose"]:
+                solve = solve_decomposed
+            elif options["two_stage"]:
+                solve = solve_two_stage
+            elif options["portfolio"]:
+                solve = solve_portfolio
+            else:
+                solve = solve_timetable
+            student_groups = group_students(
+                inputs["df"], min_courses=grid["daily_limit"] + 1
+            )
+            if options["presolve"]:
+                assignment = self._solve_presolved(
+                    problem,
+                    inputs,
+                    grid,
+                    student_groups,
+                    solve,
+                    options,
+                    fixed,
+                    initial,
+                )
+                # The cached model is the reduced one.
+                options = dict(options, model_file=None)
+            if assignment is None:
+                assignment = solve(
+                    f"{problem} exam assignment",
+                    inputs["course_list"],
+                    inputs["conflicts"],
+                    inputs["conflict_groups"],
+                    student_groups,
+                    grid["days"],
+                    grid["sessions"],
+                    grid["daily_limit"],
+                    grid["time_limit"],
+                    options,
+                    fixed=fixed,
+                    initial=initial,
+                    **inputs["capacity"]
+                )
+            if not options["no_cache"]:
+                save_solution(key, problem, assignment)
+        solved = time.monotonic()
+        if problem == "regular":
+            write = self._write_regular
+        else:
+            write = self._write_resit
+        with write_lock or nullcontext(), transaction.atomic():
+            write(assignment, inputs["df"], options["incremental"])
+        self.stdout.write(
+            f"The {problem} problem took {solved - started:.0f} seconds to"
+            f" solve and {time.monotonic() - solved:.0f} seconds to write."
+        )
+
+    def _fixed(self, problem, inputs, options):
+        if not options["incremental"]:
+            return None
+        return self._unaffected_slots(
+            inputs["period"],
+            inputs["df"],
+            inputs["course_list"],
+            inputs["conflicts"],
+            GRIDS[problem]["sessions"],
+        )
+
+    def _model_key(self, problem, inputs, fixed):
+        # The key of the model alone, without the engine and solver options.
+        model = {"fixed": sorted((fixed or {}).items())}
+        if inputs["seating"]:
+            model["rooms"] = inputs["seating"][1]
+        return input_key(
+            problem,
+            inputs["df"],
+            inputs["no_exam"],
+            GRIDS[problem],
+            {"soft": SOFT_PENALTY, "hard": HARD_PENALTY},
+            model,
+        )
+
+    def _export(self, problems, inputs, options):
+        # Writes the MIP models of the problems to a bundle that
+        # solve_bundle.py solves without Django or the database.
+        models = []
+        keys = {}
+        for problem in problems:
+            grid = GRIDS[problem]
+            course_list = inputs[problem]["course_list"]
+            self._check(problem, inputs[problem])
+            fixed = self._fixed(problem, inputs[problem], options)
+            student_groups = group_students(
+                inputs[problem]["df"], min_courses=grid["daily_limit"] + 1
+            )
+            args = (
+                f"{problem} exam assignment",
+                course_list,
+                inputs[problem]["conflict_groups"],
+                student_groups,
+                grid["days"],
+                grid["sessions"],
+                grid["daily_limit"],
+            )
+            if options["builder"] == "sparse":
+                prob = SparseModel(*args, **inputs[problem]["capacity"])
+                if fixed:
+                    prob.fix_courses(fixed)
+            else:
+                prob, exam, _ = build_model(
+                    *args, **inputs[problem]["capacity"]
+                )
+                if fixed:
+                    fix_courses(exam, fixed, grid["days"], grid["sessions"])
+            initial = dsatur(
+                course_list,
+                inputs[problem]["conflicts"],
+                grid["days"],
+                grid["sessions"],
+                fixed=fixed,
+                **inputs[problem]["capacity"]
+            )
+            keys[problem] = self._model_key(problem, inputs[problem], fixed)
+            models.append(
+                {
+                    "name": problem,
+                    "prob": prob,
+                    "fixed": sorted((fixed or {}).items()),
+                    "time_limit": options["time_limit"] or grid["time_limit"],
+                    "variables": {
+                        variable_name("course assignment", *key): key
+                        for key in product(
+                            course_list, grid["days"], grid["sessions"]
                         )
+                    },
+                    "initial": [
+                        variable_name("course assignment", course, *slot)
+                        for course, slot in (initial or {}).items()
+                    ],
+                }
+            )
+        write_bundle(
+            options["export_dir"],
+            "schedule_exams",
+            input_hash(keys),
+            models,
+            incremental=options["incremental"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"The {', '.join(problems)} problem(s) have been exported to"
+                f" {options['export_dir']}. Solve the bundle with"
+                f" solve_bundle.py and write it back with --import."
+            )
+        )
+
+    def _import(self, problems, inputs, bundle, options):
+        # The timetables of a solved bundle are written after checking that
+        # the models of the bundle are still those of the database.
+        fixed = {
+            model["name"]: {
+                course: tuple(slot) for course, slot in model["fixed"]
+            }
+            for model in bundle["models"]
+        }
+        check_bundle(
+            bundle,
+            input_hash(
+                {
+                    problem: self._model_key(
+                        problem, inputs[problem], fixed[problem]
                     )
-                    <= 1
-                    + daily_soft_penalty[student_id][day]
-                    + daily_hard_penalty[student_id][day]
+                    for problem in problems
+                }
+            ),
+        )
+        chosen = read_solution(options["import_dir"], bundle)
+        for problem in problems:
+            assignment = {
+                course: (day, session)
+                for course, day, session in chosen[problem]
+            }
+            missing = set(inputs[problem]["course_list"]) - set(assignment)
+            if missing:
+                raise CommandError(
+                    f"The solution of the {problem} problem has no slot for"
+                    f" {len(missing)} courses."
                 )
-        for course in course_list:
-            prob += (
-                lpSum(
-                    exam[course][day][session]
-                    for day, session in product(days, sessions)
+            if problem == "regular":
+                write = self._write_regular
+            else:
+                write = self._write_resit
+            with transaction.atomic():
+                write(
+                    assignment, inputs[problem]["df"], options["incremental"]
                 )
-                == 1
+
+    def _solve_presolved(
+        self,
+        problem,
+        inputs,
+        grid,
+        student_groups,
+        solve,
+        options,
+        fixed,
+        initial,
+    ):
+        # The courses that cannot change the objective are left out of the
+        # solve and placed by DSatur around the timetable of the others.
+        # Returns None if they cannot all be placed or nothing was removed,
+        # and the full problem is solved.
+        course_list = inputs["course_list"]
+        n_slots = len(grid["days"]) * len(grid["sessions"])
+        removed = removable_courses(
+            course_list, inputs["conflicts"], student_groups, n_slots, fixed
+        )
+        courses, conflicts, conflict_groups, capacity = reduce_problem(
+            course_list,
+            inputs["conflicts"],
+            inputs["conflict_groups"],
+            removed,
+            inputs["capacity"],
+        )
+        dropped = len(inputs["conflict_groups"]) - len(conflict_groups)
+        self.stdout.write(
+            f"Presolve removed {len(removed)} of {len(course_list)} courses"
+            f" of the {problem} problem, with {len(removed) * n_slots}"
+            f" assignment variables and {len(removed) + dropped * n_slots}"
+            f" constraints."
+        )
+        if not len(removed):
+            return None
+        if initial is not None:
+            initial = {course: initial[course] for course in courses}
+        # A checkpoint of the reduced problem would miss the removed
+        # courses, so only the completed timetable is saved.
+        partial = solve(
+            f"{problem} exam assignment",
+            courses,
+            conflicts,
+            conflict_groups,
+            student_groups,
+            grid["days"],
+            grid["sessions"],
+            grid["daily_limit"],
+            grid["time_limit"],
+            dict(options, checkpoint_file=None),
+            fixed=fixed,
+            initial=initial,
+            **capacity
+        )
+        assignment = dsatur(
+            course_list,
+            inputs["conflicts"],
+            grid["days"],
+            grid["sessions"],
+            fixed=partial,
+            **inputs["capacity"]
+        )
+        if (
+            assignment is not None
+            and inputs["seating"]
+            and overfull_slots(assignment, *inputs["seating"])
+        ):
+            assignment = None
+        if assignment is None:
+            self.stdout.write(
+                f"The removed courses of the {problem} problem could not be"
+                f" placed, so the full problem is solved."
             )
-        for day, session in product(days, sessions):
-            prob += (
-                lpSum(
-                    exam[course][day][session] * course_sizes[course]
-                    for course in course_list
-                )
-                <= max_size
+        elif options["checkpoint_interval"]:
+            save_checkpoint(
+                options["checkpoint_file"],
+                f"{problem} exam assignment",
+                assignment,
+                timetable_cost(
+                    assignment,
+                    student_groups,
+                    grid["days"],
+                    grid["sessions"],
+                    grid["daily_limit"],
+                ),
             )
-        for day, session in product(days, sessions):
-            for large_course in large_courses:
-                prob += lpSum(
-                    exam[small_course][day][session]
-                    for small_course in small_courses
-                ) <= 20 * (1 - exam[large_course][day][session])
+        return assignment
 
-            prob += (
-                lpSum(
-                    exam[course][day][session] * course_sizes[course]
-                    for course in small_courses
+    def _check(self, problem, inputs, verbose=False):
+        grid = GRIDS[problem]
+        started = time.monotonic()
+        checks = check_feasibility(
+            inputs["df"],
+            inputs["course_list"],
+            inputs["conflicts"],
+            len(grid["days"]) * len(grid["sessions"]),
+            **inputs["capacity"]
+        )
+        if inputs["seating"]:
+            sections, rooms = inputs["seating"]
+            unseated = [
+                course
+                for course in inputs["course_list"]
+                if not fits_classrooms(sections[course], rooms)
+            ]
+            checks.append(
+                (
+                    f"{len(unseated)} courses cannot be seated in the"
+                    f" {len(rooms)} classrooms on their own"
+                    + (f" ({', '.join(unseated[:10])})." if unseated else "."),
+                    not unseated,
+                )
+            )
+        if verbose:
+            for message, passed in checks:
+                self.stdout.write(
+                    f"{'Passed' if passed else 'Failed'}: {message}"
                 )
-                <= max_size
+        failed = [message for message, passed in checks if not passed]
+        if failed:
+            raise CommandError(
+                f"The {problem} problem is infeasible: {' '.join(failed)}"
+            )
+        self.stdout.write(
+            f"The feasibility checks of the {problem} problem passed in"
+            f" {time.monotonic() - started:.1f} seconds."
+        )
+
+    def _unaffected_slots(self, period, df, course_list, conflicts, sessions):
+        try:
+            snapshot = TimetableSnapshot.objects.get(period=period)
+        except TimetableSnapshot.DoesNotExist:
+            raise CommandError(
+                f"There is no published timetable for {period} to update."
+            )
+        old_df = pd.DataFrame(
+            [
+                (student_id, course)
+                for course, student_ids in json.loads(
+                    snapshot.enrollments
+                ).items()
+                for student_id in student_ids
+            ],
+            columns=["student_id", "course_code"],
+        )
+        affected = conflict_neighbourhood(
+            course_list, conflicts, changed_courses(old_df, df)
+        )
+        current = (
+            Timetable.objects.filter(exam__period=period)
+            .values_list("exam__offering__course__code", "session__short_code")
+            .distinct()
+        )
+        self.stdout.write(
+            f"{len(affected)} of {len(course_list)} courses will be"
+            f" rescheduled for {period}."
+        )
+        return {
+            course: divmod(short_code, len(sessions))
+            for course, short_code in current
+            if course in course_list and course not in affected
+        }
+
+    def _save_snapshot(self, period, df):
+        enrollments = (
+            df.groupby("course_code")["student_id"]
+            .apply(lambda ser: ser.tolist())
+            .to_dict()
+        )
+        TimetableSnapshot.objects.update_or_create(
+            period=period, defaults={"enrollments": json.dumps(enrollments)}
+        )
+
+    def _time_codes(self, period, grid):
+        # The whole grid is created at once so that writing the timetable
+        # needs no query per course.
+        n_sessions = len(grid["sessions"])
+        existing = set(
+            TimeCode.objects.filter(period=period).values_list(
+                "short_code", flat=True
+            )
+        )
+        TimeCode.objects.bulk_create(
+            TimeCode(
+                short_code=n_sessions * day + session,
+                long_code=(day // 5 + 1) * 100
+                + (day % 5 + 1) * 10
+                + session
+                + 1,
+                period=period,
+            )
+            for day, session in product(grid["days"], grid["sessions"])
+            if n_sessions * day + session not in existing
+        )
+        return {
+            divmod(time_code.short_code, n_sessions): time_code
+            for time_code in TimeCode.objects.filter(period=period)
+        }
+
+    def _exams_by_course(self, exams):
+        # Exams without students, such as the resit exams of sections that
+        # everyone passed, get no slot.
+        index = {}
+        for exam_id, course in (
+            exams.filter(enrollment__isnull=False)
+            .distinct()
+            .values_list("id", "offering__course__code")
+        ):
+            index.setdefault(course, []).append(exam_id)
+        return index
+
+    def _timetable_rows(self, period, assignment, grid, exams):
+        time_codes = self._time_codes(period, grid)
+        index = self._exams_by_course(exams)
+        return [
+            Timetable(exam_id=exam_id, session=time_codes[slot])
+            for course, slot in assignment.items()
+            for exam_id in index.get(course, [])
+        ]
+
+    def _update_timetable(self, period, assignment, grid):
+        n_sessions = len(grid["sessions"])
+        current = dict(
+            Timetable.objects.filter(exam__period=period)
+            .values_list("exam__offering__course__code", "session__short_code")
+            .distinct()
+        )
+        # Courses dropped from the period since the last run leave the
+        # timetable.
+        Timetable.objects.filter(exam__period=period).exclude(
+            exam__offering__course__code__in=list(assignment)
+        ).delete()
+        moved = {}
+        for course, (day, session) in assignment.items():
+            if current.get(course) != n_sessions * day + session:
+                moved.setdefault((day, session), []).append(course)
+        time_codes = self._time_codes(period, grid)
+        for slot, courses in moved.items():
+            Timetable.objects.filter(
+                exam__period=period, exam__offering__course__code__in=courses
+            ).update(session=time_codes[slot])
+        Timetable.objects.bulk_create(
+            self._timetable_rows(
+                period,
+                assignment,
+                grid,
+                Exam.objects.filter(period=period, timetable__isnull=True),
             )
+        )
 
-        prob += lpSum(
-            daily_soft_penalty[student][day]
-            + daily_hard_penalty[student][day] * 100
-            for student in students
-            for day in days
-        )
-        status = prob.solve(CPLEX(timeLimit=10000))
-        if status in [0, -1, -2]:
-            raise CommandError("Timetabling problem is infeasible.")
+    def _write_regular(self, assignment, df, update):
         academic_year = AcademicYear.objects.get(active=True)
         periods = [
             Period.objects.get(academic_year=academic_year, period=period)
             for period in ("midterm", "final")
         ]
-        Timetable.objects.filter(
-            exam__offering__academic_year=academic_year
-        ).delete()
-        objs = []
-        for course, day, session in product(course_list, days, sessions):
-            if abs(value(exam[course][day][session])) > 0.01:
-                for period in periods:
-                    time_code, created = TimeCode.objects.get_or_create(
-                        short_code=4 * day + session,
-                        long_code=(day // 5 + 1) * 100
-                        + (day % 5 + 1) * 10
-                        + session
-                        + 1,
-                        period=period,
-                    )
-                    related_exams = Exam.objects.filter(
-                        period=period, offering__course__code=course
-                    )
-                    for r_exam in related_exams:
-                        obj = Timetable(exam=r_exam, session=time_code)
-                        objs.append(obj)
-        Timetable.objects.bulk_create(objs)
+        if update:
+            for period in periods:
+                self._update_timetable(period, assignment, GRIDS["regular"])
+        else:
+            Timetable.objects.filter(exam__period__in=periods).delete()
+            Timetable.objects.bulk_create(
+                row
+                for period in periods
+                for row in self._timetable_rows(
+                    period,
+                    assignment,
+                    GRIDS["regular"],
+                    Exam.objects.filter(period=period),
+                )
+            )
+        self._save_snapshot(periods[0], df)
         self.stdout.write(
             self.style.SUCCESS("Midterm & final problem have been solved.")
         )
 
-    def _solve_resit(self, df, course_list, students):
-        prob = LpProblem("resit exam assignment", LpMinimize)
-        days = range(5)
-        sessions = range(5)
-
-        exam = LpVariable.dicts(
-            "course assignment", (course_list, days, sessions), 0, 1, LpInteger
-        )
-        daily_soft_penalty = LpVariable.dicts(
-            "daily soft penalty", (students, days), 0, 1, LpInteger
-        )
-        daily_hard_penalty = LpVariable.dicts(
-            "daily hard penalty", (students, days), 0, 1, LpInteger
-        )
-        conf_two = {}
-        for student_id, grouped_df in df.groupby("student_id"):
-            courses = grouped_df["course_code"]
-            for c1, c2 in combinations(courses, 2):
-                exists = conf_two.get((c1, c2))
-                if not exists:
-                    conf_two[c1, c2] = 1
-                    for day, session in product(days, sessions):
-                        prob += (
-                            exam[c1][day][session] + exam[c2][day][session]
-                        ) <= 1
-            for day in days:
-                prob += (
-                    (
-                        lpSum(
-                            exam[course][day][session]
-                            for session in sessions
-                            for course in courses
-                        )
-                    )
-                    <= 2
-                    + daily_soft_penalty[student_id][day]
-                    + daily_hard_penalty[student_id][day]
-                )
-        for course in course_list:
-            prob += (
-                lpSum(
-                    exam[course][day][session]
-                    for day, session in product(days, sessions)
-                )
-                == 1
-            )
-
-        prob += lpSum(
-            daily_soft_penalty[student][day]
-            + daily_hard_penalty[student][day] * 100
-            for student in students
-            for day in days
-        )
-        status = prob.solve(CPLEX(timeLimit=3600))
-        if status in [0, -1, -2]:
-            raise CommandError("Timetabling problem is infeasible.")
-
+    def _write_resit(self, assignment, df, update):
         academic_year = AcademicYear.objects.get(active=True)
         period = Period.objects.get(
             academic_year=academic_year, period="resit"
         )
-        objs = []
-        for course, day, session in product(course_list, days, sessions):
-            if abs(value(exam[course][day][session])) > 0.01:
-                time_code, created = TimeCode.objects.get_or_create(
-                    short_code=5 * day + session,
-                    long_code=(day // 5 + 1) * 100
-                    + (day % 5 + 1) * 10
-                    + session
-                    + 1,
-                    period=period,
-                )
-                related_exams = Exam.objects.filter(
-                    period=period, offering__course__code=course
+        if update:
+            self._update_timetable(period, assignment, GRIDS["resit"])
+        else:
+            Timetable.objects.filter(exam__period=period).delete()
+            Timetable.objects.bulk_create(
+                self._timetable_rows(
+                    period,
+                    assignment,
+                    GRIDS["resit"],
+                    Exam.objects.filter(period=period),
                 )
-                for r_exam in related_exams:
-                    obj = Timetable(exam=r_exam, session=time_code)
-                    objs.append(obj)
-        Timetable.objects.bulk_create(objs)
+            )
+        self._save_snapshot(period, df)
 
         self.stdout.write(self.style.SUCCESS("Resit problem has been solved."))
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ._cache import list_entries
+from ._cache import prune
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument("--prune", action="store_true")
+        parser.add_argument("--older-than", type=float)
+        parser.add_argument("--max-size", type=float)
+
+    def handle(self, *args, **options):
+        if options["prune"]:
+            older_than = options["older_than"]
+            max_size = options["max_size"]
+            if older_than is None and max_size is None:
+                older_than = 0
+            removed = prune(
+                older_than=None if older_than is None else older_than * 86400,
+                max_size=None if max_size is None else max_size * 2**20,
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Removed {len(removed)} cache entries, freeing"
+                    f" {sum(e['size'] for e in removed) / 2 ** 20:.1f} MB."
+                )
+            )
+            return
+        entries = list_entries()
+        now = time.time()
+        for entry in entries:
+            contents = [
+                name
+                for name in ("model", "solution", "checkpoint")
+                if entry[name]
+            ]
+            self.stdout.write(
+                f"{entry['key'][:12]}  {entry['problem'] or '-':24}"
+                f"  {entry['size'] / 2 ** 20:8.1f} MB"
+                f"  {(now - entry['modified']) / 86400:6.1f} days"
+                f"  {', '.join(contents)}"
+            )
+        self.stdout.write(
+            f"{len(entries)} entries,"
+            f" {sum(e['size'] for e in entries) / 2 ** 20:.1f} MB in"
+            f" {settings.SOLVER_CACHE_DIR}"
+        )
@@ -0,0 +1,23 @@
+# Generated by Django 2.1.7 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0002_auto_20190309_1647'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimetableSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enrollments', models.TextField()),
+                ('created', models.DateTimeField(auto_now=True)),
+                ('period', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='exams.Period')),
+            ],
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.1.7 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0003_timetablesnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolverRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('command', models.CharField(max_length=30)),
+                ('problem', models.CharField(max_length=100)),
+                ('solver', models.CharField(max_length=10)),
+                ('threads', models.PositiveSmallIntegerField(null=True)),
+                ('variables', models.PositiveIntegerField(null=True)),
+                ('constraints', models.PositiveIntegerField(null=True)),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(default='Running', max_length=30)),
+                ('objective', models.FloatField(blank=True, null=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='exams.AcademicYear')),
+            ],
+            options={
+                'ordering': ('-started',),
+            },
+        ),
+        migrations.CreateModel(
+            name='SolverProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('elapsed', models.FloatField()),
+                ('incumbent', models.FloatField(blank=True, null=True)),
+                ('bound', models.FloatField(blank=True, null=True)),
+                ('gap', models.FloatField(blank=True, null=True)),
+                ('nodes', models.PositiveIntegerField(blank=True, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='exams.SolverRun')),
+            ],
+            options={
+                'ordering': ('run', 'elapsed'),
+            },
+        ),
+    ]
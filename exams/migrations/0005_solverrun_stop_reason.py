@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0004_solverrun_solverprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solverrun',
+            name='stop_reason',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 2.1.7 on 2026-10-18 18:59
+
+from collections import Counter
+from itertools import combinations
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_course_conflicts(apps, schema_editor):
+    CourseConflict = apps.get_model('exams', 'CourseConflict')
+    Enrollment = apps.get_model('exams', 'Enrollment')
+    courses = {}
+    for student, period, course in Enrollment.objects.values_list(
+        'student', 'exam__period', 'exam__offering__course'
+    ).distinct():
+        courses.setdefault((student, period), set()).add(course)
+    shared = Counter(
+        (period, course_a, course_b)
+        for (student, period), student_courses in courses.items()
+        for course_a, course_b in combinations(sorted(student_courses), 2)
+    )
+    CourseConflict.objects.bulk_create(
+        [
+            CourseConflict(
+                period_id=period,
+                course_a_id=course_a,
+                course_b_id=course_b,
+                shared_students=shared_students,
+            )
+            for (period, course_a, course_b), shared_students in shared.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0005_solverrun_stop_reason'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseConflict',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shared_students', models.PositiveIntegerField()),
+                ('course_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exams.Course')),
+                ('course_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exams.Course')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='exams.Period')),
+            ],
+            options={
+                'unique_together': {('period', 'course_a', 'course_b')},
+            },
+        ),
+        migrations.RunPython(
+            fill_course_conflicts, migrations.RunPython.noop
+        ),
+    ]
@@ -243,6 +243,50 @@ class Timetable(models.Model):
         return f"{self.id}"
 
 
+class TimetableSnapshot(models.Model):
+    period = models.OneToOneField(Period, on_delete=models.CASCADE)
+    enrollments = models.TextField()
+    created = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.period}"
+
+
+class SolverRun(models.Model):
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE)
+    command = models.CharField(max_length=30)
+    problem = models.CharField(max_length=100)
+    solver = models.CharField(max_length=10)
+    threads = models.PositiveSmallIntegerField(null=True)
+    variables = models.PositiveIntegerField(null=True)
+    constraints = models.PositiveIntegerField(null=True)
+    started = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(blank=True, null=True)
+    status = models.CharField(max_length=30, default="Running")
+    objective = models.FloatField(blank=True, null=True)
+    stop_reason = models.CharField(max_length=20, blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.command} {self.problem} {self.started:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        ordering = ("-started",)
+
+
+class SolverProgress(models.Model):
+    run = models.ForeignKey(
+        SolverRun, on_delete=models.CASCADE, related_name="progress"
+    )
+    elapsed = models.FloatField()
+    incumbent = models.FloatField(blank=True, null=True)
+    bound = models.FloatField(blank=True, null=True)
+    gap = models.FloatField(blank=True, null=True)
+    nodes = models.PositiveIntegerField(blank=True, null=True)
+
+    class Meta:
+        ordering = ("run", "elapsed")
+
+
 class Sitting(models.Model):
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
     classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE)
@@ -276,6 +320,26 @@ class Enrollment(models.Model):
         return "Enrollment {0:05}".format(self.id)
 
 
+class CourseConflict(models.Model):
+    # The number of students enrolled in both courses in a period, stored
+    # once per pair with course_a having the lower id. Kept current by the
+    # signals in exams.signals.
+    period = models.ForeignKey(Period, on_delete=models.CASCADE)
+    course_a = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name="+"
+    )
+    course_b = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name="+"
+    )
+    shared_students = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = (("period", "course_a", "course_b"),)
+
+    def __str__(self):
+        return f"{self.course_a.code} - {self.course_b.code} ({self.period})"
+
+
 class Chair(models.Model):
     classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE)
     COLUMN_CHOICES = [(col, col) for col in list("ABCDEF")]
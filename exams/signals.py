@@ -0,0 +1,130 @@
+import threading
+from contextlib import contextmanager
+from itertools import combinations
+
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from .models import CourseConflict
+from .models import Enrollment
+from .models import Exam
+
+_state = threading.local()
+
+
+@contextmanager
+def bulk_enrollment_changes():
+    # The signals below update the conflicts one enrollment at a time. Bulk
+    # loads pause them and rebuild the conflicts of the changed periods
+    # afterwards with add_course_conflicts_to_db.
+    _state.paused = True
+    try:
+        yield
+    finally:
+        _state.paused = False
+
+
+def _paused():
+    return getattr(_state, "paused", False)
+
+
+def _pending():
+    # The courses of each (student, period) before the enrollments being
+    # saved or deleted change them.
+    if not hasattr(_state, "pending"):
+        _state.pending = {}
+    return _state.pending
+
+
+def _courses(student_id, period):
+    return set(
+        Enrollment.objects.filter(
+            student=student_id, exam__period=period
+        ).values_list("exam__offering__course", flat=True)
+    )
+
+
+def _pairs(courses):
+    # A student in several sections of a course counts once.
+    return set(combinations(sorted(courses), 2))
+
+
+def _remember(student_id, exam_id):
+    period = (
+        Exam.objects.filter(pk=exam_id)
+        .values_list("period", flat=True)
+        .first()
+    )
+    if period is not None:
+        _pending().setdefault(
+            (student_id, period), _courses(student_id, period)
+        )
+
+
+def _update_conflicts():
+    # Compares the courses of the remembered students with their courses
+    # now. A queryset delete removes all its enrollments before the first
+    # post_delete, so the first update settles all of them.
+    pending, _state.pending = _pending(), {}
+    for (student_id, period), before in pending.items():
+        after = _courses(student_id, period)
+        for course_a, course_b in _pairs(after) - _pairs(before):
+            pair = dict(
+                period_id=period, course_a_id=course_a, course_b_id=course_b
+            )
+            conflict, created = CourseConflict.objects.get_or_create(
+                defaults={"shared_students": 1}, **pair
+            )
+            if not created:
+                CourseConflict.objects.filter(pk=conflict.pk).update(
+                    shared_students=F("shared_students") + 1
+                )
+        for course_a, course_b in _pairs(before) - _pairs(after):
+            pair = dict(
+                period_id=period, course_a_id=course_a, course_b_id=course_b
+            )
+            CourseConflict.objects.filter(
+                shared_students__lte=1, **pair
+            ).delete()
+            CourseConflict.objects.filter(**pair).update(
+                shared_students=F("shared_students") - 1
+            )
+
+
+@receiver(pre_save, sender=Enrollment)
+def remember_saved_enrollment(sender, instance, raw, **kwargs):
+    # An enrollment moved to another student or exam changes the courses of
+    # both its old and its new student.
+    if raw or _paused():
+        return
+    if instance.pk is not None:
+        saved = (
+            Enrollment.objects.filter(pk=instance.pk)
+            .values_list("student", "exam")
+            .first()
+        )
+        if saved is not None:
+            _remember(*saved)
+    _remember(instance.student_id, instance.exam_id)
+
+
+@receiver(post_save, sender=Enrollment)
+def update_saved_enrollment_conflicts(sender, instance, raw, **kwargs):
+    if not raw and not _paused():
+        _update_conflicts()
+
+
+@receiver(pre_delete, sender=Enrollment)
+def remember_deleted_enrollment(sender, instance, **kwargs):
+    if not _paused():
+        _remember(instance.student_id, instance.exam_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def update_deleted_enrollment_conflicts(sender, instance, **kwargs):
+    if not _paused():
+        _update_conflicts()
@@ -1 +1,1291 @@
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from io import StringIO
+from itertools import combinations
+from itertools import product
+from multiprocessing import Manager
+from types import SimpleNamespace
+from unittest import mock
 
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
+from pulp import LpSolutionIntegerFeasible
+from pulp import LpSolutionOptimal
+from pulp import LpStatusInfeasible
+from pulp import LpStatusNotSolved
+from pulp.mps_lp import readMPS
+
+from exams.management.commands._bundle import SOLUTION_FILE
+from exams.management.commands._bundle import read_bundle
+from exams.management.commands._cache import entry_path
+from exams.management.commands._cache import input_key
+from exams.management.commands._cache import load_solution
+from exams.management.commands._cache import prune
+from exams.management.commands._cache import save_solution
+from exams.management.commands._conflicts import build_conflict_matrix
+from exams.management.commands._conflicts import clique_cover
+from exams.management.commands._conflicts import conflict_pairs
+from exams.management.commands._conflicts import formulate_conflicts
+from exams.management.commands._helpers import add_course_conflicts_to_db
+from exams.management.commands._helpers import resit_roster
+from exams.management.commands._heuristics import SlotCapacity
+from exams.management.commands._heuristics import anneal
+from exams.management.commands._heuristics import dsatur
+from exams.management.commands._heuristics import timetable_cost
+from exams.management.commands._model import SMALL_LIMIT
+from exams.management.commands._model import build_model
+from exams.management.commands._model import fix_courses
+from exams.management.commands._portfolio import Incumbent
+from exams.management.commands._portfolio import configurations
+from exams.management.commands._portfolio import solve_portfolio
+from exams.management.commands._presolve import check_feasibility
+from exams.management.commands._presolve import course_capacity
+from exams.management.commands._presolve import group_students
+from exams.management.commands._presolve import reduce_problem
+from exams.management.commands._presolve import removable_courses
+from exams.management.commands._seating import fits_classrooms
+from exams.management.commands._seating import overfull_slots
+from exams.management.commands._presolve import restrict_capacity
+from exams.management.commands._progress import ProgressMonitor
+from exams.management.commands._progress import _stop_reason
+from exams.management.commands._progress import parse_cbc
+from exams.management.commands._progress import parse_cplex
+from exams.management.commands._sparse_model import SparseModel
+from exams.management.commands._synthetic import synthetic_enrollments
+from exams.management.commands._timetabling import GRIDS
+from exams.management.commands._timetabling import solve_timetable
+from exams.management.commands._two_stage import solve_two_stage
+from exams.management.commands.schedule_exams import CACHED_OPTIONS
+from exams.management.commands.schedule_exams import Command
+from exams.models import AcademicYear
+from exams.models import Course
+from exams.models import CourseConflict
+from exams.models import Department
+from exams.models import Enrollment
+from exams.models import Exam
+from exams.models import Instructor
+from exams.models import Offering
+from exams.models import Period
+from exams.models import Student
+from exams.models import TimeCode
+from exams.models import Timetable
+from exams.signals import bulk_enrollment_changes
+
+
+def synthetic_problem(n_students=2000):
+    # A faculty of this size has one large course, the common English
+    # course of the first year.
+    df = synthetic_enrollments(n_students)
+    capacity = course_capacity(df)
+    course_list = capacity["course_sizes"].index
+    conflicts = build_conflict_matrix(df, course_list)
+    return df, course_list, conflicts, capacity
+
+
+def make_exams(sections, periods):
+    # An academic year with the given periods and an exam of every
+    # (course code, section) offering in each of them, keyed by period,
+    # course code and section.
+    academic_year = AcademicYear.objects.create(year=2018, semester="fall")
+    periods = {
+        period: Period.objects.create(
+            academic_year=academic_year, period=period
+        )
+        for period in periods
+    }
+    department = Department.objects.create(
+        code="BUS", name_en="Business", name_tr="İşletme"
+    )
+    instructor = Instructor.objects.create(
+        user=User.objects.create(username="instructor"),
+        name="Instructor",
+        display_name="Instructor",
+        slug="instructor",
+    )
+    exams = {}
+    for code, section in sections:
+        offering = Offering.objects.create(
+            course=Course.objects.get_or_create(code=code, name=code)[0],
+            department=department,
+            section=section,
+            academic_year=academic_year,
+            instructor_in_charge=instructor,
+        )
+        for name, period in periods.items():
+            exams[name, code, section] = Exam.objects.create(
+                offering=offering, period=period
+            )
+    return periods, exams
+
+
+def make_students(usernames):
+    # The timetabling commands identify students by their TC number.
+    return [
+        Student.objects.create(
+            user=User.objects.create(username=username), tckn=int(username)
+        )
+        for username in usernames
+    ]
+
+
+class TimetableTestCase(SimpleTestCase):
+    grid = GRIDS["regular"]
+
+    def assertValidTimetable(
+        self, assignment, course_list, conflicts, capacity
+    ):
+        self.assertIsNotNone(assignment)
+        self.assertEqual(set(assignment), set(course_list))
+        slots = defaultdict(list)
+        for course, (day, session) in assignment.items():
+            self.assertIn(day, self.grid["days"])
+            self.assertIn(session, self.grid["sessions"])
+            slots[day, session].append(course)
+        for course_a, course_b, _ in conflict_pairs(course_list, conflicts):
+            self.assertNotEqual(assignment[course_a], assignment[course_b])
+        for courses in slots.values():
+            self.assertLessEqual(
+                capacity["course_sizes"][courses].sum(), capacity["max_size"]
+            )
+            small = capacity["small_courses"].intersection(courses)
+            if len(capacity["large_courses"].intersection(courses)):
+                self.assertEqual(len(small), 0)
+            elif len(capacity["large_courses"]):
+                self.assertLessEqual(len(small), SMALL_LIMIT)
+
+
+class DSaturTests(TimetableTestCase):
+    def setUp(self):
+        _, self.course_list, self.conflicts, self.capacity = (
+            synthetic_problem()
+        )
+
+    def test_timetable_meets_conflict_and_capacity_rules(self):
+        assignment = dsatur(
+            self.course_list,
+            self.conflicts,
+            self.grid["days"],
+            self.grid["sessions"],
+            **self.capacity
+        )
+        self.assertValidTimetable(
+            assignment, self.course_list, self.conflicts, self.capacity
+        )
+
+    def test_fixed_courses_keep_their_slots(self):
+        fixed = {self.course_list[0]: (3, 2), self.course_list[1]: (0, 0)}
+        assignment = dsatur(
+            self.course_list,
+            self.conflicts,
+            self.grid["days"],
+            self.grid["sessions"],
+            fixed=fixed,
+            **self.capacity
+        )
+        self.assertValidTimetable(
+            assignment, self.course_list, self.conflicts, self.capacity
+        )
+        for course, slot in fixed.items():
+            self.assertEqual(assignment[course], slot)
+
+
+class AnnealTests(TimetableTestCase):
+    def setUp(self):
+        df, self.course_list, self.conflicts, self.capacity = (
+            synthetic_problem()
+        )
+        self.student_groups = group_students(
+            df, min_courses=self.grid["daily_limit"] + 1
+        )
+        self.fixed = {self.course_list[0]: (3, 2)}
+        self.initial = dsatur(
+            self.course_list,
+            self.conflicts,
+            self.grid["days"],
+            self.grid["sessions"],
+            fixed=self.fixed,
+            **self.capacity
+        )
+
+    def cost(self, assignment):
+        return timetable_cost(
+            assignment,
+            self.student_groups,
+            self.grid["days"],
+            self.grid["sessions"],
+            self.grid["daily_limit"],
+        )
+
+    def test_timetable_meets_rules_and_improves_on_start(self):
+        assignment = anneal(
+            self.course_list,
+            self.conflicts,
+            self.student_groups,
+            self.grid["days"],
+            self.grid["sessions"],
+            self.grid["daily_limit"],
+            self.initial,
+            2,
+            fixed=self.fixed,
+            **self.capacity
+        )
+        self.assertValidTimetable(
+            assignment, self.course_list, self.conflicts, self.capacity
+        )
+        self.assertEqual(assignment[self.course_list[0]], (3, 2))
+        self.assertLessEqual(self.cost(assignment), self.cost(self.initial))
+
+
+class LazyConflictTests(TimetableTestCase):
+    def test_timed_out_round_falls_back_to_the_start(self):
+        df, course_list, conflicts, capacity = synthetic_problem(500)
+        student_groups = group_students(
+            df, min_courses=self.grid["daily_limit"] + 1
+        )
+        parser = Command().create_parser("manage.py", "schedule_exams")
+        options = dict(
+            vars(parser.parse_args(["--conflicts", "lazy"])), record=False
+        )
+        initial = dsatur(
+            course_list,
+            conflicts,
+            self.grid["days"],
+            self.grid["sessions"],
+            **capacity
+        )
+        # Two rounds whose solutions put every course in the same slot,
+        # then a round that runs out of time without a solution.
+        clashing = {course: (0, 0) for course in course_list}
+        module = "exams.management.commands._timetabling"
+        with mock.patch(
+            f"{module}.solve_warm_started", side_effect=[1, 1, 0]
+        ) as solve, mock.patch(
+            f"{module}.read_assignment", return_value=clashing
+        ):
+            assignment = solve_timetable(
+                "regular exam assignment",
+                course_list,
+                conflicts,
+                formulate_conflicts(course_list, conflicts, "lazy"),
+                student_groups,
+                self.grid["days"],
+                self.grid["sessions"],
+                self.grid["daily_limit"],
+                self.grid["time_limit"],
+                options,
+                initial=initial,
+                **capacity
+            )
+        self.assertEqual(solve.call_count, 3)
+        self.assertEqual(assignment, initial)
+        self.assertValidTimetable(assignment, course_list, conflicts, capacity)
+
+
+def solve_until_stopped(*args, initial=None, **kwargs):
+    # Stands in for solve_timetable in the configurations of a portfolio.
+    options = args[9]
+    started = time.monotonic()
+    while not options["incumbent"].stopped():
+        if time.monotonic() - started > 60:
+            raise CommandError("The configuration was not stopped.")
+        time.sleep(0.1)
+    return initial
+
+
+def prove_target_at_once(*args, initial=None, **kwargs):
+    # The configuration given by the options proves the gap target at once.
+    options = args[9]
+    if options["engine"] == "mip" and options["conflicts"] == "clique":
+        options["incumbent"].stop()
+        return initial
+    return solve_until_stopped(*args, initial=initial, **kwargs)
+
+
+class PortfolioTests(SimpleTestCase):
+    grid = GRIDS["regular"]
+
+    def setUp(self):
+        parser = Command().create_parser("manage.py", "schedule_exams")
+        self.options = vars(
+            parser.parse_args(
+                ["--portfolio", "--solver", "cbc", "--workers", "3"]
+            )
+        )
+
+    def test_incumbent_keeps_the_best_timetable(self):
+        with Manager() as manager:
+            incumbent = Incumbent(manager.Lock(), manager.dict())
+            self.assertEqual(incumbent.get(), (None, None))
+            incumbent.offer({"A": (0, 0)}, 10)
+            incumbent.offer({"A": (1, 0)}, 12)
+            self.assertEqual(incumbent.get(), ({"A": (0, 0)}, 10))
+            incumbent.offer({"A": (2, 0)}, 5)
+            self.assertEqual(incumbent.get(), ({"A": (2, 0)}, 5))
+            self.assertFalse(incumbent.stopped())
+            incumbent.stop()
+            self.assertTrue(incumbent.stopped())
+
+    @mock.patch(
+        "exams.management.commands._portfolio._available", return_value=False
+    )
+    def test_configurations(self, _):
+        configs = configurations(self.options, 5)
+        self.assertEqual(
+            configs,
+            [
+                {
+                    "engine": "mip",
+                    "solver": "cbc",
+                    "conflicts": "clique",
+                    "seed": 27,
+                },
+                {"engine": "annealing", "seed": 27},
+                {
+                    "engine": "mip",
+                    "solver": "cbc",
+                    "conflicts": "pairwise",
+                    "seed": 27,
+                },
+                {
+                    "engine": "mip",
+                    "solver": "cbc",
+                    "conflicts": "clique",
+                    "seed": 28,
+                },
+                {"engine": "annealing", "seed": 28},
+            ],
+        )
+        # Annealing cannot seat the exams in classrooms.
+        seated = configurations(dict(self.options, seating=([], [])), 2)
+        self.assertEqual(
+            [config["engine"] for config in seated], ["mip", "mip"]
+        )
+
+    def solve(self, time_limit):
+        df, course_list, conflicts, capacity = synthetic_problem(300)
+        initial = dsatur(
+            course_list,
+            conflicts,
+            self.grid["days"],
+            self.grid["sessions"],
+            **capacity
+        )
+        started = time.monotonic()
+        assignment = solve_portfolio(
+            "regular exam assignment",
+            course_list,
+            conflicts,
+            clique_cover(course_list, conflicts),
+            group_students(df, min_courses=self.grid["daily_limit"] + 1),
+            self.grid["days"],
+            self.grid["sessions"],
+            self.grid["daily_limit"],
+            time_limit,
+            self.options,
+            initial=initial,
+            **capacity
+        )
+        self.assertEqual(assignment, initial)
+        return time.monotonic() - started
+
+    @mock.patch(
+        "exams.management.commands._portfolio.solve_timetable",
+        side_effect=prove_target_at_once,
+    )
+    def test_all_stop_when_one_proves_the_target(self, _):
+        self.assertLess(self.solve(600), 30)
+
+    @mock.patch(
+        "exams.management.commands._portfolio.solve_timetable",
+        side_effect=solve_until_stopped,
+    )
+    def test_all_stop_at_the_time_limit(self, _):
+        elapsed = self.solve(2)
+        self.assertGreaterEqual(elapsed, 2)
+        self.assertLess(elapsed, 30)
+
+
+class FeasibilityCheckTests(SimpleTestCase):
+    def setUp(self):
+        # Every pair of five courses shares a student, but no student has
+        # more than two exams.
+        self.df = pd.DataFrame(
+            [
+                (student, course)
+                for student, pair in enumerate(combinations("ABCDE", 2))
+                for course in pair
+            ],
+            columns=["student_id", "course_code"],
+        )
+        self.course_list = pd.Index(sorted(set(self.df["course_code"])))
+        self.conflicts = build_conflict_matrix(self.df, self.course_list)
+
+    def passed(self, n_slots, **capacity):
+        return [
+            passed
+            for _, passed in check_feasibility(
+                self.df, self.course_list, self.conflicts, n_slots, **capacity
+            )
+        ]
+
+    def test_clique_larger_than_slots_fails(self):
+        self.assertEqual(self.passed(5), [True, True])
+        self.assertEqual(self.passed(4), [False, True])
+        self.assertEqual(self.passed(1), [False, False])
+
+    def test_slot_capacity(self):
+        capacity = course_capacity(self.df)
+        self.assertEqual(self.passed(5, **capacity), [True] * 4)
+        # Every course has four students.
+        capacity["max_size"] = 3
+        self.assertEqual(
+            self.passed(5, **capacity), [True, True, False, False]
+        )
+
+
+class PresolveTests(SimpleTestCase):
+    grid = GRIDS["resit"]
+
+    def setUp(self):
+        # Only student 0 has more exams than the daily limit of two. D and
+        # E are the only exams of their students, and F shares a student
+        # with every course of student 0.
+        self.df = pd.DataFrame(
+            [(0, "A"), (0, "B"), (0, "C"), (1, "D"), (2, "E")]
+            + [(3, "F"), (3, "A"), (4, "F"), (4, "B"), (5, "F"), (5, "C")],
+            columns=["student_id", "course_code"],
+        )
+        self.course_list = pd.Index(sorted(set(self.df["course_code"])))
+        self.conflicts = build_conflict_matrix(self.df, self.course_list)
+        self.student_groups = group_students(
+            self.df, min_courses=self.grid["daily_limit"] + 1
+        )
+
+    def removable(self, n_slots, fixed=None):
+        return removable_courses(
+            self.course_list,
+            self.conflicts,
+            self.student_groups,
+            n_slots,
+            fixed,
+        ).tolist()
+
+    def test_courses_without_student_groups_are_removable(self):
+        self.assertEqual(self.removable(25), ["D", "E", "F"])
+        # F conflicts with three courses.
+        self.assertEqual(self.removable(3), ["D", "E"])
+
+    def test_fixed_courses_are_kept(self):
+        self.assertEqual(self.removable(25, fixed={"D": (0, 0)}), ["E", "F"])
+
+    def test_reduced_problem_keeps_small_course_limit(self):
+        _, course_list, conflicts, capacity = synthetic_problem()
+        conflict_groups = clique_cover(course_list, conflicts)
+        courses, sub_conflicts, groups, sub_capacity = reduce_problem(
+            course_list,
+            conflicts,
+            conflict_groups,
+            capacity["large_courses"],
+            capacity,
+        )
+        self.assertEqual(len(courses), len(capacity["small_courses"]))
+        self.assertEqual(sub_conflicts.shape, (len(courses), len(courses)))
+        self.assertTrue(all(set(group) <= set(courses) for group in groups))
+        self.assertEqual(len(sub_capacity["large_courses"]), 0)
+        self.assertEqual(sub_capacity["small_limit"], SMALL_LIMIT)
+
+
+class SeatingTests(SimpleTestCase):
+    def test_exams_are_split_over_classrooms(self):
+        self.assertTrue(fits_classrooms([50], [30, 30]))
+        self.assertFalse(fits_classrooms([70], [30, 30]))
+        # An exam takes the smallest classroom it fits in, so the larger
+        # one is left for the next exam.
+        self.assertTrue(fits_classrooms([40, 10], [50, 10]))
+        self.assertTrue(fits_classrooms([60, 10], [40, 30, 10]))
+        # A classroom holds a single exam.
+        self.assertFalse(fits_classrooms([20, 20, 20], [30, 30]))
+
+    def test_overfull_slots(self):
+        sections = {"A": [40], "B": [20, 10], "C": [10], "D": [5], "E": [5]}
+        assignment = {
+            "A": (0, 0),
+            "B": (0, 0),
+            "C": (0, 0),
+            "D": (0, 0),
+            "E": (1, 0),
+        }
+        # D is dropped as A, B and C cannot be seated without it either.
+        self.assertEqual(
+            overfull_slots(assignment, sections, [40, 20, 10]),
+            [("A", "B", "C")],
+        )
+        self.assertEqual(
+            overfull_slots(assignment, sections, [40, 20, 10, 10, 5]), []
+        )
+
+
+def sessions_apart_from(apart):
+    # Stands in for _solve_days: the courses in apart cannot be placed on
+    # the same day, and the others take the sessions in turn.
+    def solve_days(name, course_list, conflicts, groups, by_day, sessions, *_):
+        return {
+            day: None
+            if apart <= set(courses)
+            else {
+                course: (day, sessions[i % len(sessions)])
+                for i, course in enumerate(courses)
+            }
+            for day, courses in by_day.items()
+        }
+
+    return solve_days
+
+
+class TwoStageTests(SimpleTestCase):
+    grid = GRIDS["resit"]
+
+    @mock.patch("exams.management.commands._two_stage._solve_days")
+    def test_unplaceable_courses_are_kept_off_the_same_day(self, solve_days):
+        solve_days.side_effect = sessions_apart_from({"A", "B"})
+        # DSatur starts every course on the first day.
+        df = pd.DataFrame(
+            [(0, "C"), (0, "D"), (0, "E"), (1, "A"), (2, "B")],
+            columns=["student_id", "course_code"],
+        )
+        course_list = pd.Index(sorted(set(df["course_code"])))
+        conflicts = build_conflict_matrix(df, course_list)
+        parser = Command().create_parser("manage.py", "schedule_exams")
+        options = dict(
+            vars(parser.parse_args(["--two-stage", "--solver", "cbc"])),
+            threads=1,
+            record=False,
+        )
+        assignment = solve_two_stage(
+            "resit exam assignment",
+            course_list,
+            conflicts,
+            clique_cover(course_list, conflicts),
+            group_students(df, min_courses=self.grid["daily_limit"] + 1),
+            self.grid["days"],
+            self.grid["sessions"],
+            self.grid["daily_limit"],
+            60,
+            options,
+        )
+        first_days = solve_days.call_args_list[0][0][4]
+        self.assertTrue(
+            any({"A", "B"} <= set(courses) for courses in first_days.values())
+        )
+        self.assertGreater(solve_days.call_count, 1)
+        self.assertEqual(set(assignment), set(course_list))
+        self.assertNotEqual(assignment["A"][0], assignment["B"][0])
+
+
+class CliqueCoverTests(SimpleTestCase):
+    def test_cliques_cover_every_conflict(self):
+        _, course_list, conflicts, _ = synthetic_problem()
+        pairs = {
+            (course_a, course_b)
+            for course_a, course_b, _ in conflict_pairs(course_list, conflicts)
+        }
+        cliques = clique_cover(course_list, conflicts)
+        covered = set()
+        for clique in cliques:
+            for course_a, course_b in combinations(sorted(clique), 2):
+                # Every pair of a clique conflicts.
+                self.assertIn((course_a, course_b), pairs)
+                covered.add((course_a, course_b))
+        self.assertEqual(covered, pairs)
+        self.assertLess(len(cliques), len(pairs))
+
+
+class CourseConflictSignalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        periods, exams = make_exams(
+            [("A", 1), ("B", 1), ("B", 2), ("C", 1)], ["midterm"]
+        )
+        cls.period = periods["midterm"]
+        cls.exams = {
+            (code, section): exam
+            for (_, code, section), exam in exams.items()
+        }
+        cls.students = make_students(["0", "1", "2"])
+
+    def enroll(self, student, *exams):
+        return [
+            Enrollment.objects.create(
+                student=self.students[student], exam=self.exams[exam]
+            )
+            for exam in exams
+        ]
+
+    def conflicts(self):
+        return sorted(
+            CourseConflict.objects.filter(period=self.period).values_list(
+                "course_a__code", "course_b__code", "shared_students"
+            )
+        )
+
+    def assertMatchesRebuild(self):
+        kept = self.conflicts()
+        add_course_conflicts_to_db([self.period])
+        self.assertEqual(kept, self.conflicts())
+
+    def test_enrollment_changes_match_rebuild(self):
+        self.enroll(0, ("A", 1), ("B", 1))
+        moved, _ = self.enroll(1, ("A", 1), ("C", 1))
+        self.enroll(2, ("B", 1), ("C", 1))
+        self.assertMatchesRebuild()
+        self.assertEqual(
+            self.conflicts(), [("A", "B", 1), ("A", "C", 1), ("B", "C", 1)]
+        )
+        moved.exam = self.exams["B", 1]
+        moved.save()
+        self.assertMatchesRebuild()
+        # A second section of a course a student already takes adds no
+        # conflicts.
+        (second,) = self.enroll(0, ("B", 2))
+        self.assertMatchesRebuild()
+        second.delete()
+        self.assertMatchesRebuild()
+        Enrollment.objects.filter(student=self.students[2]).delete()
+        self.assertMatchesRebuild()
+        self.exams["A", 1].delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(self.conflicts(), [("B", "C", 1)])
+
+    def test_bulk_changes_leave_conflicts_to_rebuild(self):
+        with bulk_enrollment_changes():
+            self.enroll(0, ("A", 1), ("B", 1))
+        self.assertEqual(self.conflicts(), [])
+        add_course_conflicts_to_db([self.period])
+        self.assertEqual(self.conflicts(), [("A", "B", 1)])
+
+
+class ResitRosterTests(SimpleTestCase):
+    def test_failed_and_absent_students_sit_the_resit(self):
+        df = pd.DataFrame(
+            [
+                ("FF", "Geçti", 40.0),
+                (" fd ", "Geçti", 45.0),
+                ("CC", "Kaldı", 70.0),
+                ("GR", "Geçti", 0.0),
+                ("DD", "Geçti", None),
+                ("AA", "Geçti", 90.0),
+                ("DC", " Geçti ", 55.0),
+            ],
+            columns=["grade", "status", "final"],
+        )
+        self.assertEqual(resit_roster(df).index.tolist(), [0, 1, 2, 3, 4])
+
+
+class LoadResitRosterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        periods, exams = make_exams(
+            [("A", 1), ("B", 1), ("C", 1)], ["midterm", "resit"]
+        )
+        cls.midterm, cls.resit = periods["midterm"], periods["resit"]
+        courses = {"100": "AB", "101": "AC", "102": "ABC"}
+        for student, codes in zip(make_students(courses), courses.values()):
+            for period, code in product(periods, codes):
+                Enrollment.objects.create(
+                    student=student, exam=exams[period, code, 1]
+                )
+
+    def resit_enrollments(self):
+        return sorted(
+            Enrollment.objects.filter(exam__period=self.resit).values_list(
+                "student__user__username", "exam__offering__course__code"
+            )
+        )
+
+    def test_only_resit_enrollments_of_passing_students_are_deleted(self):
+        # 102 has no row for A, so that enrollment goes too.
+        roster = pd.DataFrame(
+            [
+                ("100", "A", "İşletme", "1.Şube", "Kaldı", "FF", 20.0),
+                ("100", "B", "İşletme", "1.Şube", "Geçti", "BB", 80.0),
+                ("101", "A", "İşletme", "1.Şube", "Geçti", "DD", None),
+                ("101", "C", "İşletme", "1.Şube", "Kaldı", "CC", 70.0),
+                ("102", "B", "İşletme", "1.Şube", "Geçti", "GR", 0.0),
+                ("102", "C", "İşletme", "1.Şube", "Geçti", "AA", 95.0),
+            ],
+            columns=[
+                "OGRENCI_NO",
+                "OZEL_KOD",
+                "DERSI_ALDIGI_BOLUM",
+                "DERSI_ALDIGI_SUBESI",
+                "DURUMU",
+                "BASARI_NOTU",
+                "FINAL_NOTU",
+            ],
+        )
+        with mock.patch(
+            "exams.management.commands.load_resit_roster.read_excel_file",
+            return_value=roster,
+        ):
+            call_command(
+                "load_resit_roster", filepath="roster.xls", stdout=StringIO()
+            )
+        self.assertEqual(
+            self.resit_enrollments(),
+            [("100", "A"), ("101", "A"), ("101", "C"), ("102", "B")],
+        )
+        self.assertEqual(
+            Enrollment.objects.filter(exam__period=self.midterm).count(), 7
+        )
+        self.assertEqual(
+            sorted(
+                CourseConflict.objects.filter(period=self.resit).values_list(
+                    "course_a__code", "course_b__code", "shared_students"
+                )
+            ),
+            [("A", "C", 1)],
+        )
+
+
+class TimetableWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.periods, exams = make_exams(
+            [("A", 1), ("B", 1), ("B", 2), ("C", 1)],
+            ["midterm", "final", "resit"],
+        )
+        students = make_students(["0", "1"])
+        enrollments = {
+            "midterm": [(0, "A", 1), (0, "B", 1), (1, "B", 2), (1, "C", 1)],
+            "final": [(0, "A", 1), (0, "B", 1), (1, "B", 2), (1, "C", 1)],
+            # Nobody sits the resit of C.
+            "resit": [(0, "A", 1), (1, "B", 2)],
+        }
+        for period, rows in enrollments.items():
+            for student, code, section in rows:
+                Enrollment.objects.create(
+                    student=students[student],
+                    exam=exams[period, code, section],
+                )
+        cls.df = pd.DataFrame(
+            [(0, "A"), (0, "B"), (1, "B"), (1, "C")],
+            columns=["student_id", "course_code"],
+        )
+
+    def rows(self, period):
+        return sorted(
+            Timetable.objects.filter(
+                exam__period=self.periods[period],
+                session__period=self.periods[period],
+            ).values_list(
+                "exam__offering__course__code",
+                "exam__offering__section",
+                "session__short_code",
+            )
+        )
+
+    def test_regular_timetable(self):
+        command = Command(stdout=StringIO())
+        assignment = {"A": (0, 1), "B": (2, 3), "C": (9, 0)}
+        # Writing again replaces the rows.
+        for _ in range(2):
+            command._write_regular(assignment, self.df, False)
+        for period in ["midterm", "final"]:
+            self.assertEqual(
+                self.rows(period),
+                [("A", 1, 1), ("B", 1, 11), ("B", 2, 11), ("C", 1, 36)],
+            )
+            time_codes = TimeCode.objects.filter(period=self.periods[period])
+            self.assertEqual(time_codes.count(), 40)
+            self.assertEqual(time_codes.get(short_code=36).long_code, 251)
+        self.assertEqual(Timetable.objects.count(), 8)
+
+    def test_resit_timetable(self):
+        command = Command(stdout=StringIO())
+        assignment = {"A": (0, 1), "B": (4, 4), "C": (1, 0)}
+        for _ in range(2):
+            command._write_resit(assignment, self.df, False)
+        self.assertEqual(self.rows("resit"), [("A", 1, 1), ("B", 2, 24)])
+        self.assertEqual(
+            TimeCode.objects.filter(period=self.periods["resit"]).count(), 25
+        )
+        self.assertEqual(Timetable.objects.count(), 2)
+
+
+@override_settings(SOLVER_CACHE_DIR=tempfile.gettempdir())
+class IncrementalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.periods, cls.exams = make_exams(
+            [("A", 1), ("B", 1), ("B", 2), ("C", 1), ("D", 1), ("E", 1)]
+            + [("F", 1)],
+            ["midterm", "final", "resit"],
+        )
+        cls.students = make_students(["0", "1", "2", "3", "4"])
+        enrollments = [
+            (0, "A", 1),
+            (0, "B", 1),
+            (1, "B", 2),
+            (1, "C", 1),
+            (2, "D", 1),
+            (2, "E", 1),
+            (3, "F", 1),
+            (4, "C", 1),
+        ]
+        for period in ["midterm", "final"]:
+            for student, code, section in enrollments:
+                Enrollment.objects.create(
+                    student=cls.students[student],
+                    exam=cls.exams[period, code, section],
+                )
+
+    def schedule(self, *args):
+        call_command(
+            "schedule_exams",
+            "--draft",
+            "--no-cache",
+            "--problems",
+            "regular",
+            *args,
+            stdout=StringIO()
+        )
+
+    def slots(self):
+        # The slot of every course in every period, and the number of rows.
+        rows = Timetable.objects.filter(
+            exam__period__in=[self.periods["midterm"], self.periods["final"]]
+        )
+        slots = set(
+            rows.values_list(
+                "exam__period__period",
+                "exam__offering__course__code",
+                "session__short_code",
+            )
+        )
+        return slots, rows.count()
+
+    def test_only_the_conflict_neighbourhood_moves(self):
+        self.schedule()
+        published, count = self.slots()
+        self.assertEqual(count, 14)
+        # The only student of F moves to E, so F is dropped and E and its
+        # neighbour D may move.
+        enrollment = Enrollment.objects.get(
+            student=self.students[3], exam__period__period="midterm"
+        )
+        enrollment.exam = self.exams["midterm", "E", 1]
+        enrollment.save()
+        self.schedule("--incremental")
+        updated, count = self.slots()
+        kept = {row for row in published if row[1] in "ABC"}
+        self.assertLessEqual(kept, updated)
+        self.assertEqual({course for _, course, _ in updated}, set("ABCDE"))
+        # One slot per course and period, and one row per exam.
+        self.assertEqual(len(updated), 10)
+        self.assertEqual(count, 12)
+        midterm = {
+            course: slot
+            for period, course, slot in updated
+            if period == "midterm"
+        }
+        self.assertNotEqual(midterm["D"], midterm["E"])
+
+
+class BundleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.periods, cls.exams = make_exams(
+            [("A", 1), ("B", 1), ("C", 1), ("D", 1)],
+            ["midterm", "final", "resit"],
+        )
+        cls.students = make_students(["0", "1", "2"])
+        enrollments = [(0, "A"), (0, "B"), (1, "B"), (1, "C"), (2, "D")]
+        for period in ["midterm", "final"]:
+            for student, code in enrollments:
+                Enrollment.objects.create(
+                    student=cls.students[student],
+                    exam=cls.exams[period, code, 1],
+                )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+
+    def export(self):
+        call_command(
+            "schedule_exams",
+            "--problems",
+            "regular",
+            "--export",
+            self.path,
+            stdout=StringIO(),
+        )
+        return read_bundle(self.path, "schedule_exams")
+
+    def solve(self, bundle):
+        # The solution solve_bundle.py would write, with the starting
+        # timetable of the export as the optimal one.
+        with open(os.path.join(self.path, SOLUTION_FILE), "w") as f:
+            json.dump(
+                {
+                    "command": bundle["command"],
+                    "input_hash": bundle["input_hash"],
+                    "solver": "cbc",
+                    "models": {
+                        model["name"]: {
+                            "status": "Optimal",
+                            "objective": 0,
+                            "values": dict.fromkeys(model["initial"], 1.0),
+                        }
+                        for model in bundle["models"]
+                    },
+                },
+                f,
+            )
+
+    def load(self):
+        call_command(
+            "schedule_exams", "--import", self.path, stdout=StringIO()
+        )
+
+    def test_round_trip(self):
+        bundle = self.export()
+        (model,) = bundle["models"]
+        self.assertEqual(model["name"], "regular")
+        self.assertTrue(
+            os.path.exists(os.path.join(self.path, model["mps"]))
+        )
+        with self.assertRaisesRegex(CommandError, "has not been solved"):
+            self.load()
+        self.solve(bundle)
+        self.load()
+        expected = {
+            (course, len(GRIDS["regular"]["sessions"]) * day + session)
+            for course, day, session in (
+                model["variables"][name] for name in model["initial"]
+            )
+        }
+        for period in ["midterm", "final"]:
+            rows = Timetable.objects.filter(exam__period=self.periods[period])
+            self.assertEqual(rows.count(), 4)
+            self.assertEqual(
+                set(
+                    rows.values_list(
+                        "exam__offering__course__code", "session__short_code"
+                    )
+                ),
+                expected,
+            )
+
+    def test_changed_enrollments_make_the_bundle_stale(self):
+        bundle = self.export()
+        self.solve(bundle)
+        Enrollment.objects.create(
+            student=self.students[2], exam=self.exams["midterm", "C", 1]
+        )
+        with self.assertRaisesRegex(CommandError, "database has changed"):
+            self.load()
+        self.assertFalse(Timetable.objects.exists())
+
+
+class SolverCacheTests(SimpleTestCase):
+    # A value other than the default for every option in CACHED_OPTIONS.
+    changed = {
+        "conflicts": "pairwise",
+        "draft": True,
+        "engine": "annealing",
+        "seed": 28,
+        "decompose": True,
+        "two_stage": True,
+        "portfolio": True,
+        "presolve": True,
+        "workers": 4,
+        "solver": "cbc",
+        "time_limit": 60,
+        "mip_gap": 0.01,
+        "stall_time": 600,
+        "objective_target": 100.0,
+        "checkpoint_interval": 1800,
+    }
+
+    def setUp(self):
+        self.df = synthetic_enrollments(200)
+        parser = Command().create_parser("manage.py", "schedule_exams")
+        self.options = vars(parser.parse_args([]))
+
+    def key(self, df, options):
+        return input_key(
+            "regular",
+            df,
+            [],
+            GRIDS["regular"],
+            {"soft": 1, "hard": 100},
+            {name: options[name] for name in CACHED_OPTIONS},
+        )
+
+    def test_key_changes_with_every_cached_option(self):
+        self.assertEqual(set(self.changed), set(CACHED_OPTIONS))
+        key = self.key(self.df, self.options)
+        for name, value in self.changed.items():
+            with self.subTest(option=name):
+                self.assertNotEqual(self.options[name], value)
+                self.assertNotEqual(
+                    self.key(self.df, dict(self.options, **{name: value})),
+                    key,
+                )
+
+    def test_key_changes_with_enrollments(self):
+        self.assertNotEqual(
+            self.key(self.df.iloc[1:], self.options),
+            self.key(self.df, self.options),
+        )
+        self.assertEqual(
+            self.key(self.df.iloc[::-1], self.options),
+            self.key(self.df, self.options),
+        )
+
+    def test_prune_removes_least_recently_used_entries(self):
+        with tempfile.TemporaryDirectory() as root:
+            with override_settings(SOLVER_CACHE_DIR=root):
+                for key in ["used", "unused"]:
+                    save_solution(key, "regular", {"A": (0, 0)})
+                    path = entry_path(key)
+                    saved = time.time() - 3600
+                    for name in os.listdir(path):
+                        os.utime(os.path.join(path, name), (saved, saved))
+                    os.utime(path, (saved, saved))
+                self.assertEqual(load_solution("used"), {"A": (0, 0)})
+                removed = prune(older_than=60)
+                self.assertEqual(
+                    [entry["key"] for entry in removed], ["unused"]
+                )
+
+
+class SolverProgressTests(SimpleTestCase):
+    def test_parse_cbc(self):
+        lines = {
+            "Cbc0010I After 0 nodes, 1 on tree, 1e+50 best solution, best"
+            " possible 1050 (1.20 seconds)": {
+                "nodes": 0,
+                "bound": 1050,
+                "seconds": 1.2,
+            },
+            "Cbc0012I Integer solution of 1500 found by DiveCoefficient"
+            " after 345 iterations and 0 nodes (3.21 seconds)": {
+                "incumbent": 1500,
+                "nodes": 0,
+                "seconds": 3.21,
+            },
+            "Cbc0010I After 100 nodes, 45 on tree, 1234.5 best solution,"
+            " best possible 1100 (12.34 seconds)": {
+                "nodes": 100,
+                "incumbent": 1234.5,
+                "bound": 1100,
+                "seconds": 12.34,
+            },
+            "Cbc0005I Partial search - best objective 1234 (best possible"
+            " 1200), took 10000 iterations and 200 nodes (300.00 seconds)": {
+                "incumbent": 1234,
+                "bound": 1200,
+                "nodes": 200,
+                "seconds": 300,
+            },
+            "Cbc0011I Exiting as integer gap of 12.5 less than 1e-10 or"
+            " 10%": None,
+        }
+        for line, progress in lines.items():
+            with self.subTest(line=line):
+                self.assertEqual(parse_cbc(line), progress)
+
+    def test_parse_cplex(self):
+        lines = {
+            "      Nodes                                         Cuts/": None,
+            "   Node  Left     Objective  IInf  Best Integer    Best Bound"
+            "    ItCnt     Gap": None,
+            "      0     0     1050.0000   245                   1050.0000"
+            "     1234         ": None,
+            "*     0+    0                         1500.0000     1050.0000"
+            "            30.00%": {
+                "nodes": 0,
+                "incumbent": 1500,
+                "bound": 1050,
+                "gap": 0.3,
+            },
+            "    100    45     1100.2000   120     1234.5000     1080.0000"
+            "    15000   12.51%": {
+                "nodes": 100,
+                "incumbent": 1234.5,
+                "bound": 1080,
+                "gap": 0.1251,
+            },
+        }
+        for line, progress in lines.items():
+            with self.subTest(line=line):
+                self.assertEqual(parse_cplex(line), progress)
+
+    def monitor(self, **rules):
+        return ProgressMonitor(
+            SimpleNamespace(started=timezone.now()), parse_cbc, None, **rules
+        )
+
+    def test_stall_is_timed_by_the_solver_clock(self):
+        monitor = self.monitor(stall_time=30)
+        self.assertIsNone(monitor.met_rule())
+        monitor.follow(1500, 10)
+        monitor.follow(1400, 20)
+        monitor.follow(None, 49)
+        self.assertIsNone(monitor.met_rule())
+        monitor.follow(1400, 50)
+        self.assertEqual(monitor.met_rule(), "stall")
+
+    def test_objective_target(self):
+        monitor = self.monitor(objective_target=1400)
+        monitor.follow(1500, 10)
+        self.assertIsNone(monitor.met_rule())
+        monitor.follow(1400, 20)
+        self.assertEqual(monitor.met_rule(), "objective target")
+
+    def test_portfolio_stop(self):
+        stopped = False
+        monitor = self.monitor(stop=lambda: stopped)
+        self.assertIsNone(monitor.met_rule())
+        stopped = True
+        self.assertEqual(monitor.met_rule(), "portfolio")
+
+    def test_stop_reason_after_the_solve(self):
+        cases = [
+            (LpSolutionOptimal, 1, None, "optimal"),
+            (LpSolutionOptimal, 1, 0.01, "gap target"),
+            (LpSolutionIntegerFeasible, 1, None, "time limit"),
+            (LpSolutionIntegerFeasible, LpStatusNotSolved, None, "time limit"),
+            (None, LpStatusInfeasible, None, "infeasible"),
+        ]
+        for sol_status, status, mip_gap, reason in cases:
+            with self.subTest(reason=reason):
+                prob = SimpleNamespace(sol_status=sol_status, status=status)
+                self.assertEqual(
+                    _stop_reason(prob, {"mip_gap": mip_gap}), reason
+                )
+
+
+def canonical_model(path):
+    # The rows, columns and objective of an MPS file in an order that does
+    # not depend on the builder.
+    model = readMPS(path, 1)
+    rows = sorted(
+        (
+            row["sense"],
+            row["constant"],
+            tuple(
+                sorted(
+                    (term["name"], term["value"])
+                    for term in row["coefficients"]
+                )
+            ),
+        )
+        for row in model["constraints"]
+    )
+    columns = sorted(
+        (column["name"], column["cat"], column["lowBound"], column["upBound"])
+        for column in model["variables"]
+    )
+    objective = sorted(
+        (term["name"], term["value"])
+        for term in model["objective"]["coefficients"]
+    )
+    return rows, columns, objective
+
+
+class SparseModelTests(SimpleTestCase):
+    grid = GRIDS["regular"]
+
+    def setUp(self):
+        self.df, self.course_list, conflicts, self.capacity = (
+            synthetic_problem()
+        )
+        self.conflict_groups = clique_cover(self.course_list, conflicts)
+
+    def assertSameModel(self, course_list, conflict_groups, **capacity):
+        student_groups = group_students(
+            self.df[self.df["course_code"].isin(course_list)],
+            min_courses=self.grid["daily_limit"] + 1,
+        )
+        args = (
+            "regular exam assignment",
+            course_list,
+            conflict_groups,
+            student_groups,
+            self.grid["days"],
+            self.grid["sessions"],
+            self.grid["daily_limit"],
+        )
+        fixed = {course_list[0]: (3, 2)}
+        prob, exam, _ = build_model(*args, **capacity)
+        fix_courses(exam, fixed, self.grid["days"], self.grid["sessions"])
+        sparse = SparseModel(*args, **capacity)
+        sparse.fix_courses(fixed)
+        with tempfile.TemporaryDirectory() as root:
+            prob.writeMPS(os.path.join(root, "pulp.mps"))
+            sparse.write_mps(os.path.join(root, "sparse.mps"))
+            expected = canonical_model(os.path.join(root, "pulp.mps"))
+            self.assertEqual(
+                canonical_model(os.path.join(root, "sparse.mps")), expected
+            )
+        return expected
+
+    def test_same_model_as_pulp(self):
+        self.assertSameModel(
+            self.course_list, self.conflict_groups, **self.capacity
+        )
+
+    def test_part_without_large_courses_keeps_small_course_limit(self):
+        courses = self.course_list[
+            self.course_list.isin(self.capacity["small_courses"])
+        ][:40]
+        members = set(courses)
+        conflict_groups = [
+            group
+            for group in (
+                tuple(course for course in group if course in members)
+                for group in self.conflict_groups
+            )
+            if len(group) > 1
+        ]
+        capacity = restrict_capacity(self.capacity, courses)
+        rows, _, _ = self.assertSameModel(courses, conflict_groups, **capacity)
+        n_slots = len(self.grid["days"]) * len(self.grid["sessions"])
+        limits = [
+            row
+            for row in rows
+            if row[1] == -SMALL_LIMIT
+            and len(row[2]) == len(courses)
+            and all(value == 1 for _, value in row[2])
+        ]
+        self.assertEqual(len(limits), n_slots)
+
+
+class SlotCapacityTests(SimpleTestCase):
+    def test_part_without_large_courses_keeps_small_course_limit(self):
+        _, course_list, _, capacity = synthetic_problem()
+        courses = course_list[course_list.isin(capacity["small_courses"])]
+        # Without large courses in the full problem, there is no limit.
+        no_large = dict(capacity, large_courses=capacity["large_courses"][:0])
+        for full, limited in [(capacity, True), (no_large, False)]:
+            sub_capacity = restrict_capacity(full, courses)
+            sub_capacity["max_size"] = capacity["course_sizes"].sum()
+            state = SlotCapacity(courses, 2, **sub_capacity)
+            for course in range(SMALL_LIMIT):
+                state.add(course, 0)
+            self.assertEqual(
+                state.feasible_slots(SMALL_LIMIT).tolist(), [not limited, True]
+            )
@@ -71,4 +71,10 @@ urlpatterns = [
         name="classroom-list",
     ),
     path("dolubos/", report_views.dolubos, name="dolubos"),
+    path("solver-runs/", views.solver_runs, name="solver-runs"),
+    path(
+        "solver-runs/<int:pk>/",
+        views.solver_run_detail,
+        name="solver-run-detail",
+    ),
 ]
@@ -6,6 +6,8 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import F
 from django.db.models.fields import DateField
 from django.db.models.functions import Cast
+from django.http import Http404
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
 from django.shortcuts import render
@@ -29,6 +31,8 @@ from .models import Instructor
 from .models import Layout
 from .models import Period
 from .models import Sitting
+from .models import SolverProgress
+from .models import SolverRun
 from .models import Student
 from .models import TimeCode
 
@@ -298,3 +302,38 @@ def select_list(request):
         .order_by("time")
     )
     return render(request, "attendance/select.html", {"date_list": qs})
+
+
+SOLVER_RUN_FIELDS = (
+    "id",
+    "command",
+    "problem",
+    "solver",
+    "threads",
+    "variables",
+    "constraints",
+    "started",
+    "finished",
+    "status",
+    "stop_reason",
+    "objective",
+)
+
+
+@user_passes_test(is_administrative)
+def solver_runs(request):
+    runs = SolverRun.objects.values(*SOLVER_RUN_FIELDS)[:50]
+    return JsonResponse({"runs": list(runs)})
+
+
+@user_passes_test(is_administrative)
+def solver_run_detail(request, pk):
+    run = SolverRun.objects.filter(pk=pk).values(*SOLVER_RUN_FIELDS).first()
+    if run is None:
+        raise Http404
+    run["progress"] = list(
+        SolverProgress.objects.filter(run=pk).values(
+            "elapsed", "incumbent", "bound", "gap", "nodes"
+        )
+    )
+    return JsonResponse(run)
@@ -91,6 +91,8 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
 
+SOLVER_CACHE_DIR = os.path.join(BASE_DIR, 'solver_cache')
+
 
 LOGIN_URL = '/accounts/login/'
 LOGOUT_URL = '/accounts/logout/'
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# Solves a bundle exported with the --export option of schedule_exams,
+# assign_classrooms or assign_assistants. Only PuLP, a solver and a checkout
+# of this repository are needed, not Django or the database, so the bundle
+# can be copied to any machine and solved there. The solver is built by the
+# same code as in the management commands. The solution is written to the
+# bundle, from where the command that exported it reads it with --import.
+import argparse
+import json
+import os
+import time
+
+from pulp import LpProblem
+from pulp import LpStatus
+from pulp import value
+
+from exams.management.commands._pulp_solvers import make_solver
+
+BUNDLE_FILE = "bundle.json"
+SOLUTION_FILE = "solution.json"
+
+
+def get_solver(args, time_limit, warm_start):
+    try:
+        return make_solver(
+            args.solver,
+            threads=args.threads,
+            time_limit=args.time_limit or time_limit,
+            mip_gap=args.mip_gap,
+            workdir=args.workdir,
+            warm_start=warm_start,
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+
+def solve_model(path, model, args):
+    variables, prob = LpProblem.fromMPS(os.path.join(path, model["mps"]))
+    # The starting solution of the export, if there is one. HiGHS cannot
+    # be warm started from the command line.
+    initial = set(model.get("initial", []))
+    warm_start = bool(initial) and args.solver != "highs"
+    if warm_start:
+        for name in model["variables"]:
+            if name in variables:
+                variables[name].setInitialValue(int(name in initial))
+    prob.solve(get_solver(args, model.get("time_limit"), warm_start))
+    return {
+        "status": LpStatus[prob.status],
+        "objective": value(prob.objective),
+        "values": {
+            name: variables[name].varValue
+            for name in model["variables"]
+            if name in variables and variables[name].varValue
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("bundle")
+    parser.add_argument(
+        "--solver", choices=["cplex", "cbc", "highs"], default="cplex"
+    )
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    parser.add_argument("--time-limit", type=int)
+    parser.add_argument("--mip-gap", type=float)
+    parser.add_argument("--workdir")
+    args = parser.parse_args()
+    with open(os.path.join(args.bundle, BUNDLE_FILE)) as f:
+        bundle = json.load(f)
+    results = {}
+    for model in bundle["models"]:
+        started = time.monotonic()
+        results[model["name"]] = result = solve_model(args.bundle, model, args)
+        print(
+            f"{model['name']}: {result['status']}, objective"
+            f" {result['objective']}, {time.monotonic() - started:.0f}"
+            f" seconds."
+        )
+    path = os.path.join(args.bundle, SOLUTION_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(
+            {
+                "command": bundle["command"],
+                "input_hash": bundle["input_hash"],
+                "solver": args.solver,
+                "models": results,
+            },
+            f,
+        )
+    os.replace(path + ".tmp", path)
+    print(
+        f"The solution has been written to {path}. Copy the bundle back and"
+        f" import it with {bundle['command']} --import."
+    )
+
+
+if __name__ == "__main__":
+    main()